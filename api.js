@@ -42,14 +42,19 @@
       err.body = data;
       throw err;
     }
-    return bodyText ? asJSON() : {};
+    const data = bodyText ? asJSON() : {};
+    // Set by the service worker when it answered from its cache: when that copy was stored
+    const cachedAt = Number(res.headers.get('X-SW-Cached-At')) || 0;
+    if (cachedAt && data && typeof data === 'object') data._cachedAt = cachedAt;
+    return data;
   }
 
-  async function getReferrals(params = {}) {
+  // `fresh` asks the service worker to skip its cached copy and wait for the network
+  async function getReferrals(params = {}, { fresh = false } = {}) {
     const url = new URL('/api/get_referrals', location.origin);
     Object.entries(params).forEach(([k, v]) => { if (v != null && v !== '') url.searchParams.set(k, v); });
     const headers = await buildHeaders();
-    return fetchJSON(url.href, { headers });
+    return fetchJSON(url.href, { headers, cache: fresh ? 'no-cache' : 'default' });
   }
 
   async function submitReferral(payload) {
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
+
+
+# One encoder instance: json.dumps with non-default arguments builds a new one per call
+_stdlib_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def _use_orjson() -> bool:
+    return _ORJSON_AVAILABLE and os.environ.get('JSON_ENCODER', 'auto') != 'stdlib'
+
+
+def _orjson_dumps(value) -> str:
+    try:
+        return orjson.dumps(value).decode('utf-8')
+    except TypeError:
+        # orjson.JSONEncodeError subclasses TypeError; e.g. ints beyond 64 bits,
+        # which get_all_records produces from long numeric cells
+        return _stdlib_encoder.encode(value)
+
+
+def encoder():
+    """The JSON encoding function to use: orjson when installed, stdlib json otherwise."""
+    return _orjson_dumps if _use_orjson() else _stdlib_encoder.encode
+
+
+def dumps(value) -> str:
+    """Compact JSON text."""
+    return encoder()(value)
+
+
+def encoder_name() -> str:
+    return 'orjson' if _use_orjson() else 'json'
+
+
+class FragmentCache:
+    """Encoded JSON per row, reused while the row's content is unchanged.
+
+    Entries are keyed by (shard, row number) and hold the row as last encoded
+    next to its text; a row is re-encoded only when its content differs. Rows
+    passed in are kept, so callers must not mutate them afterwards.
+    The cache is cleared when it grows past `max_entries` (rows are re-encoded
+    on the next request).
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def encode_rows(self, records: list) -> str:
+        """JSON array text for records, reusing cached fragments for unchanged rows."""
+        entries = self._entries
+        encode = encoder()
+        parts = []
+        hits = 0
+        fresh = {}
+        for r in records:
+            key = (r.get('_shard', ''), r.get('_row_number'))
+            cached = entries.get(key)
+            # Comparing against the previously encoded row is exact and cheaper than hashing it
+            if cached is not None and cached[0] == r:
+                parts.append(cached[1])
+                hits += 1
+                continue
+            text = encode(r)
+            if key[1] is not None:
+                fresh[key] = (r, text)
+            parts.append(text)
+        with self._lock:
+            if len(entries) + len(fresh) > self.max_entries:
+                entries.clear()
+            entries.update(fresh)
+            self._stats['hits'] += hits
+            self._stats['misses'] += len(records) - hits
+        return '[' + ','.join(parts) + ']'
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'encoder': encoder_name()}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+row_fragments = FragmentCache(max_entries=_env_int('JSON_FRAGMENT_CACHE_MAX', 50000))
+
+
+def encode_with_raw(fields: dict, raw_key: str, raw_json: str) -> str:
+    """Encode `fields` as a JSON object with an already-encoded value appended under `raw_key`."""
+    head = dumps(fields)
+    sep = '' if head == '{}' else ','
+    return head[:-1] + sep + dumps(raw_key) + ':' + raw_json + '}'
@@ -0,0 +1,295 @@
+import csv
+import io
+import json
+import math
+import os
+import time
+from datetime import datetime
+from urllib.parse import quote
+from api.auth import require_auth
+from api.encoding import dumps
+from api.sheets import DeadlineExceeded, SheetsUnavailable, iter_shard_rows, shard_headers, shards_for_departments
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 64 * 1024
+# One response page stays under these (Vercel: 4.5 MB bodies, maxDuration 15s)
+MAX_PAGE_BYTES = 4 * 1024 * 1024
+PAGE_SECONDS = 10
+EXTRA_COLUMNS = ['_shard', '_row_number']
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_date(value: str, end: bool = False):
+    """'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' -> comparable timestamp string (sheet format)."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == '%Y-%m-%d' and end:
+            # A bare end date includes the whole day
+            return parsed.strftime('%Y-%m-%d') + ' 23:59:59'
+        return parsed.strftime('%Y-%m-%d %H:%M:%S')
+    raise ValueError(f'Invalid date: {value} (use YYYY-MM-DD)')
+
+
+def _error(status: int, message: str, extra_headers: dict = None):
+    return {
+        'statusCode': status,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json',
+            **(extra_headers or {})
+        },
+        'body': json.dumps({'success': False, 'error': message})
+    }
+
+
+def _scan(shards, start, page_size, deadline=None):
+    """(cursor after the row, record) for every row from `start` = (shard index, row) on.
+
+    Records are tagged with _shard and _row_number like get_referrals.
+    """
+    index, row = start
+    for i in range(index, len(shards)):
+        shard = shards[i]
+        for row_number, record in iter_shard_rows(shard, page_size, row if i == index else 2, deadline):
+            yield (i, row_number + 1), {**record, '_shard': shard, '_row_number': row_number}
+
+
+def _matches(record, departments, date_from, date_to) -> bool:
+    if departments and record.get('Department To') not in departments:
+        return False
+    if date_from or date_to:
+        ts = str(record.get('Timestamp') or '')
+        if not ts or (date_from and ts < date_from) or (date_to and ts > date_to):
+            return False
+    return True
+
+
+def _parse_cursor(value: str, shards):
+    """'<shard>:<row>' from X-Export-Next -> (shard index, row); the shard must be one this export reads."""
+    if not value:
+        return 0, 2
+    shard, sep, row = value.rpartition(':')
+    if not sep or shard not in shards or not row.isdigit() or int(row) < 2:
+        raise ValueError(f'Invalid cursor: {value}')
+    return shards.index(shard), int(row)
+
+
+def _format_cursor(shards, position) -> str:
+    index, row = position
+    return f'{shards[index]}:{row}'
+
+
+def _chunks(pieces):
+    """Group small strings into ~CHUNK_SIZE strings so each write is worth a syscall."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_cell(value):
+    # Spreadsheet apps evaluate cells starting with these as formulas
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _CsvLines:
+    """CSV text per record; the first call also writes the header row."""
+
+    def __init__(self):
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out)
+        self.columns = None
+
+    def _row(self, values) -> str:
+        self._writer.writerow([_csv_cell(v) for v in values])
+        text = self._out.getvalue()
+        self._out.seek(0)
+        self._out.truncate()
+        return text
+
+    def header(self, headers) -> str:
+        self.columns = [h for h in headers if h not in EXTRA_COLUMNS] + EXTRA_COLUMNS
+        return self._row(self.columns)
+
+    def __call__(self, record) -> str:
+        head = self.header(record.keys()) if self.columns is None else ''
+        return head + self._row([record.get(c, '') for c in self.columns])
+
+
+def _ndjson_line(record) -> str:
+    return dumps(record) + '\n'
+
+
+def _incomplete(fmt, reason) -> str:
+    """Last line of a truncated stream, so the cut is detectable."""
+    if fmt == 'csv':
+        return f'# export incomplete: {reason}\n'
+    return dumps({'_error': f'export incomplete: {reason}'}) + '\n'
+
+
+def _stream(fmt, records, headers):
+    """The whole export as text chunks (EXPORT_STREAMING=1)."""
+    line = _CsvLines() if fmt == 'csv' else _ndjson_line
+
+    def lines():
+        for record in records:
+            yield line(record)
+        if fmt == 'csv' and line.columns is None:
+            yield line.header(headers())
+
+    try:
+        yield from _chunks(lines())
+    except SheetsUnavailable as e:
+        # The 200 status is already decided
+        yield _incomplete(fmt, e)
+
+
+def _page(fmt, scan, start, filters, headers, deadline: float, max_bytes: int):
+    """One bounded response: (body, next position or None, why it stopped early or None).
+
+    Stops before `deadline` (time.monotonic()) or before the body would pass
+    `max_bytes` UTF-8 bytes, and when Sheets fails after some rows were read;
+    the returned position resumes the scan at the first row not included.
+    Raises SheetsUnavailable if Sheets fails before any row was read.
+    """
+    line = _CsvLines() if fmt == 'csv' else _ndjson_line
+    parts = []
+    size = 0
+    position = start
+    scanned = False
+    stop = None
+    try:
+        for after, record in scan:
+            # Every page reads at least one row, so paging always moves forward
+            if scanned and time.monotonic() >= deadline:
+                stop = 'time'
+                break
+            if _matches(record, *filters):
+                text = line(record)
+                length = len(text.encode('utf-8'))
+                if parts and size + length > max_bytes:
+                    stop = 'size'
+                    break
+                parts.append(text)
+                size += length
+            position = after
+            scanned = True
+    except SheetsUnavailable as e:
+        if not scanned:
+            raise
+        stop = 'time' if isinstance(e, DeadlineExceeded) else 'sheets'
+    if fmt == 'csv' and line.columns is None:
+        parts.append(line.header(headers()))
+    return ''.join(parts), position if stop else None, stop
+
+
+def handler(request):
+    # Handle CORS
+    if request.method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            }
+        }
+
+    if request.method != 'GET':
+        return _error(405, 'Method not allowed')
+
+    try:
+        # Auth check
+        session, err = require_auth(request)
+        if err:
+            return err
+
+        query = getattr(request, 'args', None) or getattr(request, 'query', {}) or {}
+        fmt = (query.get('format') or 'csv').lower()
+        if fmt not in FORMATS:
+            return _error(400, f"Unsupported format: {fmt} (use {' or '.join(FORMATS)})")
+        try:
+            date_from = _parse_date(query.get('from'))
+            date_to = _parse_date(query.get('to'), end=True)
+        except ValueError as e:
+            return _error(400, str(e))
+        dept_filter = query.get('department')
+        departments = [d.strip() for d in dept_filter.split(',') if d.strip()] if dept_filter else []
+        page_size = max(1, _env_int('EXPORT_PAGE_SIZE', 500))
+
+        shards = shards_for_departments(departments or None)
+        try:
+            start = _parse_cursor(query.get('cursor'), shards)
+        except ValueError as e:
+            return _error(400, str(e))
+        filters = (departments, date_from, date_to)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': FORMATS[fmt],
+            'Content-Disposition': f'attachment; filename="referrals-{stamp}.{fmt}"',
+            'Cache-Control': 'no-store'
+        }
+
+        if os.environ.get('EXPORT_STREAMING') == '1':
+            # The whole export as an iterator of text chunks (dev_server.py). Fetch
+            # the first row before answering so an unavailable sheet is a 503
+            scan = _scan(shards, start, page_size)
+            try:
+                first = next(scan, None)
+            except SheetsUnavailable as e:
+                return _error(503, str(e), {'Retry-After': str(max(1, math.ceil(e.retry_after)))})
+
+            def records():
+                if first is not None:
+                    yield first[1]
+                    for _, record in scan:
+                        yield record
+
+            matching = (r for r in records() if _matches(r, *filters))
+            body = _stream(fmt, matching, lambda: shard_headers(shards[start[0]]))
+            return {'statusCode': 200, 'headers': headers, 'body': body}
+
+        # Deployed: one page per request, bounded in time and size. X-Export-Next
+        # carries the cursor for the rest; pass it back as ?cursor= to continue
+        deadline = time.monotonic() + _env_int('EXPORT_TIME_BUDGET', PAGE_SECONDS)
+        try:
+            body, position, stop = _page(
+                fmt, _scan(shards, start, page_size, deadline), start, filters,
+                lambda: shard_headers(shards[start[0]], deadline),
+                deadline, _env_int('EXPORT_MAX_BYTES', MAX_PAGE_BYTES))
+        except SheetsUnavailable as e:
+            return _error(503, str(e), {'Retry-After': str(max(1, math.ceil(e.retry_after)))})
+        if position is not None:
+            headers['X-Export-Next'] = quote(_format_cursor(shards, position), safe=':')
+            headers['X-Export-Stopped'] = stop
+            headers['Access-Control-Expose-Headers'] = 'X-Export-Next, X-Export-Stopped'
+        return {'statusCode': 200, 'headers': headers, 'body': body}
+
+    except Exception as e:
+        return _error(500, str(e))
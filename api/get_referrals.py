@@ -1,13 +1,10 @@
 import json
+import math
 import os
-import gspread
-from google.oauth2.service_account import Credentials
+import time
 from api.auth import require_auth
-
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
+from api.encoding import encode_with_raw, row_fragments
+from api.sheets import SheetsUnavailable, flush_journal, read_referrals
 
 def handler(request):
     # Handle CORS
@@ -33,16 +30,6 @@ def handler(request):
         if err:
             return err
 
-        # Set up Google Sheets connection
-        credentials_json = json.loads(os.environ['GOOGLE_CREDENTIALS'])
-        credentials = Credentials.from_service_account_info(credentials_json).with_scopes(SCOPES)
-        gc = gspread.authorize(credentials)
-        sheet = gc.open_by_key(os.environ['SHEET_ID']).sheet1
-        
-        # Get all records and attach row numbers (header assumed at row 1)
-        records_raw = sheet.get_all_records()
-        records = [{**r, "_row_number": i + 2} for i, r in enumerate(records_raw)]
-        
         # Optional filtering + header-based defaults
         headers = getattr(request, 'headers', {}) or {}
         headers_norm = {str(k).lower(): v for k, v in headers.items()}
@@ -75,8 +62,37 @@ def handler(request):
                 # If DEPT_CODES invalid, ignore errors and proceed without validation
                 pass
 
-        if dept_filter:
-            records = [r for r in records if r.get('Department To') == dept_filter]
+        # Comma-separated departments are allowed; each maps to its shard
+        departments = [d.strip() for d in dept_filter.split(',') if d.strip()] if dept_filter else []
+
+        # Read only the shards needed (all of them, concurrently, when unfiltered).
+        # Records carry _shard and _row_number; concurrent requests share reads.
+        # While Sheets is down the last good snapshot is served instead.
+        # A fresh process may answer from the disk snapshot while it refreshes in the background.
+        try:
+            result = read_referrals(departments or None)
+        except SheetsUnavailable as e:
+            return {
+                'statusCode': 503,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json',
+                    'Retry-After': str(max(1, math.ceil(e.retry_after)))
+                },
+                'body': json.dumps({'success': False, 'error': str(e)})
+            }
+
+        if result.stale_since is None and result.snapshot_since is None:
+            # Sheets just answered: replay writes journaled on this instance now
+            # rather than waiting for the next write to arrive here
+            try:
+                flush_journal()
+            except OSError as e:
+                print(f'Journal replay after read failed: {e}')
+
+        records = result.records
+        if departments:
+            records = [r for r in records if r.get('Department To') in departments]
         if ward_filter:
             records = [r for r in records if r.get('Ward') == ward_filter]
         if status_filter == 'pending':
@@ -84,17 +100,40 @@ def handler(request):
         elif status_filter == 'seen':
             records = [r for r in records if r.get('Clinician Seen')]
         
+        response_headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json',
+            'X-Sheets-Coalesced': '1' if result.coalesced else '0'
+        }
+        body = {
+            'success': True,
+            'count': len(records),
+            # False only when this is every referral (clients may prune local copies)
+            'filtered': bool(departments or ward_filter or status_filter),
+            # Departments applied, including the X-Dept-Name default; without ward or
+            # status filters the list is complete for these departments
+            'departments': departments
+        }
+        if result.stale_since is not None:
+            age = max(0, int(time.time() - result.stale_since))
+            response_headers['X-Data-Stale'] = '1'
+            response_headers['X-Data-Age'] = str(age)
+            response_headers['Warning'] = '110 - "Response is Stale"'
+            body['stale'] = True
+            body['stale_age'] = age
+        elif result.snapshot_since is not None:
+            # Warm-start disk snapshot (up to SHEETS_SNAPSHOT_MAX_AGE old); clients date the
+            # list by it and do not prune local copies against it
+            age = max(0, int(time.time() - result.snapshot_since))
+            response_headers['X-Data-Source'] = 'snapshot'
+            response_headers['X-Data-Age'] = str(age)
+            body['snapshot_age'] = age
+
         return {
             'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({
-                'success': True,
-                'referrals': records,
-                'count': len(records)
-            })
+            'headers': response_headers,
+            # Unchanged rows reuse their cached JSON; only new or edited rows are encoded
+            'body': encode_with_raw(body, 'referrals', row_fragments.encode_rows(records))
         }
         
     except Exception as e:
@@ -56,6 +56,27 @@ def handler(request):
     except Exception as e:
         details['sheets_access'] = f'error: {e}'
 
+    # Sheet read coalescing counters for this instance
+    try:
+        from api.sheets import read_stats
+        details['single_flight'] = read_stats()
+    except Exception as e:
+        details['single_flight'] = f'unavailable: {e}'
+
+    # Per-row JSON fragment reuse for get_referrals
+    try:
+        from api.encoding import row_fragments
+        details['json_fragments'] = row_fragments.stats()
+    except Exception as e:
+        details['json_fragments'] = f'unavailable: {e}'
+
+    # Circuit breaker state and journaled writes waiting for replay
+    try:
+        from api.sheets import breaker_stats
+        details['circuit_breaker'] = breaker_stats()
+    except Exception as e:
+        details['circuit_breaker'] = f'unavailable: {e}'
+
     return {
         'statusCode': 200,
         'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
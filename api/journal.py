@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+    _FCNTL_AVAILABLE = True
+except ImportError:  # Windows dev machines: in-process lock only
+    _FCNTL_AVAILABLE = False
+
+_lock = threading.Lock()
+
+
+def journal_path() -> str:
+    return os.environ.get('SHEETS_JOURNAL_PATH') or os.path.join(tempfile.gettempdir(), 'referral-journal.jsonl')
+
+
+def dead_letter_path() -> str:
+    return journal_path() + '.dead'
+
+
+class _Locked:
+    """Thread lock plus an advisory file lock so concurrent workers don't interleave writes."""
+
+    def __enter__(self):
+        _lock.acquire()
+        self._fh = None
+        if _FCNTL_AVAILABLE:
+            self._fh = open(journal_path() + '.lock', 'a')
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+        _lock.release()
+
+
+def _read(path: str) -> list:
+    entries = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crashed writer; skip it
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _rewrite(path: str, entries: list):
+    if not entries:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def record(op: str, **fields) -> dict:
+    """Append a pending sheet write to the journal and return the entry.
+
+    A write whose `request_id` is already pending is not added again; the
+    pending entry is returned instead.
+    """
+    entry = {'id': uuid.uuid4().hex, 'op': op, 'queued_at': time.time(), **fields}
+    with _Locked():
+        request_id = fields.get('request_id')
+        if request_id:
+            for pending_entry in _read(journal_path()):
+                if pending_entry.get('request_id') == request_id:
+                    return pending_entry
+        with open(journal_path(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    return entry
+
+
+def _count(path: str) -> int:
+    try:
+        if os.path.getsize(path) == 0:
+            return 0
+    except OSError:
+        return 0
+    return len(_read(path))
+
+
+def pending() -> int:
+    return _count(journal_path())
+
+
+def dead_letters() -> int:
+    return _count(dead_letter_path())
+
+
+def replay(apply, budget: float = 5.0, retryable=lambda error: True) -> dict:
+    """Apply journaled writes oldest first with `apply(entry)`.
+
+    Stops at the first failure for which `retryable(error)` is true (the entry
+    stays queued) or once `budget` seconds have passed. Entries that fail
+    otherwise can never succeed, so they are moved to the dead-letter file
+    with their error instead of blocking the queue. Applied entries are
+    removed from the journal.
+    """
+    done = 0
+    applied = 0
+    dead = []
+    error = None
+    deadline = time.monotonic() + budget
+    with _Locked():
+        path = journal_path()
+        entries = _read(path)
+        while done < len(entries) and time.monotonic() < deadline:
+            try:
+                apply(entries[done])
+            except Exception as e:
+                if retryable(e):
+                    error = e
+                    break
+                dead.append({**entries[done], 'error': str(e), 'failed_at': time.time()})
+            else:
+                applied += 1
+            done += 1
+        if dead:
+            with open(dead_letter_path(), 'a', encoding='utf-8') as f:
+                for entry in dead:
+                    f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        if done:
+            _rewrite(path, entries[done:])
+    return {
+        'applied': applied,
+        'dead_lettered': len(dead),
+        'remaining': len(entries) - done,
+        'error': str(error) if error else None,
+        'dead_errors': [d['error'] for d in dead],
+    }
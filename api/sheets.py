@@ -0,0 +1,691 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import gspread
+import requests
+from gspread.http_client import HTTPClient
+from google.oauth2.service_account import Credentials
+
+from api import journal, snapshots
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+SHEETS_API_ORIGIN = "https://sheets.googleapis.com"
+
+
+class _EmulatorSession(requests.Session):
+    """Unauthenticated session that sends Sheets API calls to a local emulator.
+
+    Enabled by SHEETS_EMULATOR_HOST (e.g. "127.0.0.1:8765"), used by the
+    fake Sheets server in bench/ for load tests without real credentials.
+    """
+
+    def __init__(self, host: str):
+        super().__init__()
+        host = host.rstrip('/')
+        self.base = host if host.startswith('http') else f"http://{host}"
+
+    def request(self, method, url, *args, **kwargs):
+        if isinstance(url, str) and url.startswith(SHEETS_API_ORIGIN):
+            url = self.base + url[len(SHEETS_API_ORIGIN):]
+        return super().request(method, url, *args, **kwargs)
+
+
+class _DeadlineHTTPClient(HTTPClient):
+    """HTTP client whose per-request timeout never runs past an operation deadline.
+
+    `deadline` is a time.monotonic() value or None. Each request gets the
+    usual per-call timeout, capped by the time left; with too little left it
+    raises DeadlineExceeded instead of starting a request that cannot finish.
+    """
+
+    deadline = None
+
+    def request(self, *args, **kwargs):
+        self.timeout = _call_timeout(self.deadline)
+        return super().request(*args, **kwargs)
+
+
+def _call_timeout(deadline=None):
+    # Per-call deadline: a handful of calls must fit well inside maxDuration (15s)
+    connect = _env_number('SHEETS_CONNECT_TIMEOUT', 2.0)
+    read = _env_number('SHEETS_CALL_TIMEOUT', 4.0)
+    if deadline is None:
+        return (connect, read)
+    left = deadline - time.monotonic()
+    if left < MIN_CALL_SECONDS:
+        raise DeadlineExceeded('Time budget for Google Sheets calls is spent')
+    return (min(connect, left), min(read, left))
+
+
+def get_client(deadline: float = None) -> gspread.Client:
+    emulator = os.environ.get('SHEETS_EMULATOR_HOST')
+    if emulator:
+        client = gspread.Client(None, session=_EmulatorSession(emulator), http_client=_DeadlineHTTPClient)
+    else:
+        credentials_json = json.loads(os.environ['GOOGLE_CREDENTIALS'])
+        credentials = Credentials.from_service_account_info(credentials_json).with_scopes(SCOPES)
+        client = gspread.authorize(credentials, http_client=_DeadlineHTTPClient)
+    client.http_client.deadline = deadline
+    client.set_timeout(_call_timeout(deadline))
+    return client
+
+
+DEFAULT_SHARD = ''
+
+
+def load_shards() -> dict:
+    """Department -> (spreadsheet_id, worksheet title or None) from SHEET_SHARDS.
+
+    SHEET_SHARDS env: {"Cardiology": "Cardiology", "Surgery": {"spreadsheet": "<id>", "worksheet": "Referrals"}}
+    A plain string names a worksheet inside SHEET_ID. Departments not listed
+    (and the default shard '') use the first worksheet of SHEET_ID.
+    """
+    raw = os.environ.get('SHEET_SHARDS', '{}')
+    try:
+        data = json.loads(raw)
+    except Exception:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    default_id = os.environ.get('SHEET_ID')
+    shards = {}
+    for dept, target in data.items():
+        if isinstance(target, str) and target:
+            shards[dept] = (default_id, target)
+        elif isinstance(target, dict):
+            shards[dept] = (target.get('spreadsheet') or default_id, target.get('worksheet') or None)
+    return shards
+
+
+def shard_location(shard: str, shards: dict = None):
+    shards = load_shards() if shards is None else shards
+    if shard and shard in shards:
+        return shards[shard]
+    return (os.environ['SHEET_ID'], None)
+
+
+def shard_for_department(department: str, shards: dict = None) -> str:
+    shards = load_shards() if shards is None else shards
+    return department if department in shards else DEFAULT_SHARD
+
+
+def open_shard(shard: str = DEFAULT_SHARD, deadline: float = None):
+    spreadsheet_id, worksheet = shard_location(shard)
+    spreadsheet = get_client(deadline).open_by_key(spreadsheet_id)
+    return spreadsheet.worksheet(worksheet) if worksheet else spreadsheet.sheet1
+
+
+class SingleFlightTimeout(TimeoutError):
+    pass
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    running wait for and share its result (or exception). At most
+    `max_waiters` callers queue behind one call; beyond that they run their
+    own call rather than pile onto a slow one. Waiters give up after
+    `timeout` seconds. Results are shared objects: callers must not mutate them.
+    """
+
+    def __init__(self, max_waiters: int = 64, timeout: float = 10.0):
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'leaders': 0, 'collapsed': 0, 'overflow': 0, 'timeouts': 0}
+
+    def do(self, key, fn):
+        """Return (result, shared) where shared is True if another call's result was reused."""
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['leaders'] += 1
+                role = 'leader'
+            elif call.waiters >= self.max_waiters:
+                self._stats['overflow'] += 1
+                role = 'overflow'
+            else:
+                call.waiters += 1
+                self._stats['collapsed'] += 1
+                role = 'waiter'
+
+        if role == 'overflow':
+            return fn(), False
+
+        if role == 'leader':
+            try:
+                call.result = fn()
+                return call.result, False
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+
+        if not call.event.wait(self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise SingleFlightTimeout(f'Timed out after {self.timeout}s waiting for shared sheet read')
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
+
+
+def _env_number(name: str, default, cast=float):
+    try:
+        return cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class SheetsUnavailable(Exception):
+    """Sheets is failing or the circuit breaker is open; callers should degrade."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(SheetsUnavailable):
+    """The caller's time budget ran out before a Sheets request could be made."""
+
+
+# Below this many seconds left, a request is not started at all
+MIN_CALL_SECONDS = 0.5
+
+
+def is_transient(error: BaseException) -> bool:
+    """Failures that say Sheets is unhealthy (not that the request was bad)."""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                          SingleFlightTimeout, TimeoutError)):
+        return True
+    if isinstance(error, gspread.exceptions.APIError):
+        code = getattr(error, 'code', None)
+        return code == 429 or (isinstance(code, int) and code >= 500)
+    return False
+
+
+class CircuitBreaker:
+    """Stop calling Sheets while it is failing.
+
+    Outcomes from the last `window` seconds are tracked; once at least
+    `min_calls` have been seen and the failure rate reaches `failure_rate`,
+    the breaker opens and calls fail fast with SheetsUnavailable for
+    `open_seconds`. Then a single probe call is let through (half-open): its
+    success closes the breaker, its failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_rate: float = 0.5, min_calls: int = 4, window: float = 30.0,
+                 open_seconds: float = 20.0, clock=time.monotonic):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (time, ok)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {'rejected': 0, 'opened': 0, 'probes': 0}
+
+    def _prune(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _state_at(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_at(self._clock())
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open only one probe at a time."""
+        with self._lock:
+            state = self._state_at(self._clock())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self._stats['probes'] += 1
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = self._clock()
+            if self._state_at(now) == self.HALF_OPEN:
+                self._probing = False
+                self._outcomes.clear()
+                if ok:
+                    self._state = self.CLOSED
+                else:
+                    self._open(now)
+                return
+            self._outcomes.append((now, ok))
+            self._prune(now)
+            failures = sum(1 for _, good in self._outcomes if not good)
+            total = len(self._outcomes)
+            if self._state == self.CLOSED and total >= self.min_calls and failures / total >= self.failure_rate:
+                self._open(now)
+
+    def release(self):
+        """Give up a call without recording an outcome (frees the half-open probe)."""
+        with self._lock:
+            self._probing = False
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._stats['opened'] += 1
+
+    def call(self, fn):
+        if not self.allow():
+            raise SheetsUnavailable('Google Sheets is unavailable (circuit open)', self.retry_after())
+        try:
+            result = fn()
+        except DeadlineExceeded:
+            # Our own budget ran out; says nothing about Sheets' health
+            self.release()
+            raise
+        except Exception as e:
+            transient = is_transient(e)
+            # A non-transient error still proves Sheets answered
+            self.record(not transient)
+            if transient:
+                raise SheetsUnavailable(f'Google Sheets call failed: {e}', self.retry_after()) from e
+            raise
+        self.record(True)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            self._prune(now)
+            return {
+                **self._stats,
+                'state': self._state_at(now),
+                'recent_calls': len(self._outcomes),
+                'recent_failures': sum(1 for _, good in self._outcomes if not good),
+            }
+
+
+_reads = SingleFlight(
+    max_waiters=_env_number('SHEETS_SINGLE_FLIGHT_MAX_WAITERS', 64, int),
+    timeout=_env_number('SHEETS_SINGLE_FLIGHT_TIMEOUT', 10.0),
+)
+
+
+breaker = CircuitBreaker(
+    failure_rate=_env_number('SHEETS_BREAKER_FAILURE_RATE', 0.5),
+    min_calls=_env_number('SHEETS_BREAKER_MIN_CALLS', 4, int),
+    window=_env_number('SHEETS_BREAKER_WINDOW', 30.0),
+    open_seconds=_env_number('SHEETS_BREAKER_OPEN_SECONDS', 20.0),
+)
+
+# Last good read per shard location: key -> (records, fetched_at epoch seconds).
+# Also persisted to disk (api/snapshots.py) for the next process on this machine.
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+_live_keys = set()    # shards read from Sheets by this process
+_refreshing = set()   # shards with a background read in flight
+_unsaved = {}         # key -> (records, fetched_at) waiting to be written to disk
+
+
+def _shard_key(shard: str):
+    spreadsheet_id, worksheet = shard_location(shard)
+    return (os.environ.get('SHEETS_EMULATOR_HOST'), spreadsheet_id, worksheet or 'sheet1')
+
+
+def read_all_records(shard: str = DEFAULT_SHARD):
+    """All referral records from one shard, coalescing concurrent identical reads.
+
+    Returns (records, coalesced). The records list is shared between the
+    requests that were collapsed together, so treat it as read-only.
+    Raises SheetsUnavailable when the breaker is open or the read failed.
+    """
+    key = _shard_key(shard)
+
+    def fetch():
+        records = breaker.call(lambda: open_shard(shard).get_all_records())
+        fetched_at = time.time()
+        with _snapshots_lock:
+            _snapshots[key] = (records, fetched_at)
+            _live_keys.add(key)
+        if _env_number('SHEETS_SNAPSHOT_PERSIST', 1, int):
+            # Off the critical path: waiters are released as soon as this returns
+            _persist_later(key, records, fetched_at)
+        return records
+
+    return _reads.do(key, fetch)
+
+
+def _persist(key):
+    with _snapshots_lock:
+        records, fetched_at = _unsaved.pop(key)
+    try:
+        snapshots.save(key, records, fetched_at)
+    except OSError:
+        pass  # a read-only or full /tmp only costs the warm start
+
+
+def _persist_later(key, records, fetched_at):
+    """Save a snapshot on the background pool; bursts of reads collapse into one save."""
+    with _snapshots_lock:
+        start = key not in _unsaved
+        _unsaved[key] = (records, fetched_at)
+    if start:
+        _fanout_pool().submit(_persist, key)
+
+
+def last_snapshot(shard: str = DEFAULT_SHARD):
+    """(records, fetched_at) from the last successful read of a shard, from memory or disk, or None."""
+    key = _shard_key(shard)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+    if snapshot is None:
+        loaded = snapshots.load(key)
+        if loaded is not None:
+            with _snapshots_lock:
+                snapshot = _snapshots.setdefault(key, loaded[:2])
+    return snapshot
+
+
+def _background_read(shard: str, key):
+    try:
+        read_all_records(shard)
+    except Exception:
+        pass  # the next request retries; failures are already counted by the breaker
+    finally:
+        with _snapshots_lock:
+            _refreshing.discard(key)
+
+
+def _warm_snapshot(shard: str):
+    """Serve a recent disk snapshot to a process that has not read this shard yet.
+
+    Returns (records, fetched_at) and starts a background read, or None when
+    the shard has already been read live or no usable snapshot exists.
+    """
+    key = _shard_key(shard)
+    with _snapshots_lock:
+        if key in _live_keys:
+            return None
+    snapshot = last_snapshot(shard)
+    if snapshot is None or time.time() - snapshot[1] > _env_number('SHEETS_SNAPSHOT_MAX_AGE', 300.0):
+        return None
+    with _snapshots_lock:
+        start = key not in _refreshing
+        _refreshing.add(key)
+    if start:
+        _fanout_pool().submit(_background_read, shard, key)
+    return snapshot
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _fanout_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = _env_number('SHEETS_FANOUT_WORKERS', 16, int)
+            _pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='sheets-fanout')
+        return _pool
+
+
+def shards_for_departments(departments=None) -> list:
+    """Shards to read for the given departments (None means every shard).
+
+    Shards pointing at the same worksheet are read once, under the first name.
+    """
+    shards = load_shards()
+    if departments:
+        names = [shard_for_department(d, shards) for d in departments]
+    else:
+        names = [DEFAULT_SHARD] + sorted(shards)
+    seen = {}
+    for name in names:
+        location = shard_location(name, shards)
+        if location not in seen:
+            seen[location] = name
+    return list(seen.values())
+
+
+ReferralRead = namedtuple('ReferralRead', 'records coalesced stale_since snapshot_since')
+
+
+def _read_or_snapshot(shard: str):
+    """(records, coalesced, stale_since, snapshot_since) for one shard.
+
+    stale_since is set when Sheets was unavailable and the last good snapshot
+    was used; snapshot_since when a warm-start disk snapshot was served while
+    a background read refreshes it. Both are None for a live read.
+    """
+    warm = _warm_snapshot(shard)
+    if warm is not None:
+        return warm[0], False, None, warm[1]
+    try:
+        records, shared = read_all_records(shard)
+        return records, shared, None, None
+    except (SheetsUnavailable, SingleFlightTimeout) as e:
+        snapshot = last_snapshot(shard)
+        if snapshot is None:
+            if isinstance(e, SheetsUnavailable):
+                raise
+            raise SheetsUnavailable(str(e), breaker.retry_after()) from e
+        return snapshot[0], False, snapshot[1], None
+
+
+def _oldest(a, b):
+    if a is None:
+        return b
+    return a if b is None else min(a, b)
+
+
+def read_referrals(departments=None) -> ReferralRead:
+    """Referral records across shards, each tagged with _shard and _row_number.
+
+    Multiple shards are read concurrently. Returns a ReferralRead where
+    coalesced is True if any shard read was shared with another request,
+    stale_since is the epoch time of the oldest snapshot served because Sheets
+    was unavailable, and snapshot_since the oldest warm-start snapshot served
+    from disk (both None when every shard was read live). Raises
+    SheetsUnavailable if a shard has neither a live read nor a snapshot.
+    """
+    names = shards_for_departments(departments)
+    # The calling thread reads the first shard itself so the pool only carries the rest
+    pool = _fanout_pool() if len(names) > 1 else None
+    futures = [pool.submit(_read_or_snapshot, name) for name in names[1:]] if pool else []
+    results = [_read_or_snapshot(names[0])] + [f.result() for f in futures]
+    records = []
+    coalesced = False
+    stale_since = None
+    snapshot_since = None
+    for name, (raw, shared, stale, warm) in zip(names, results):
+        coalesced = coalesced or shared
+        stale_since = _oldest(stale_since, stale)
+        snapshot_since = _oldest(snapshot_since, warm)
+        # Header assumed at row 1 of every shard
+        records.extend({**r, '_shard': name, '_row_number': i + 2} for i, r in enumerate(raw))
+    return ReferralRead(records, coalesced, stale_since, snapshot_since)
+
+
+def shard_headers(shard: str = DEFAULT_SHARD, deadline: float = None) -> list:
+    """The shard's header row (row 1), read through the circuit breaker."""
+    sheet = breaker.call(lambda: open_shard(shard, deadline))
+    return breaker.call(lambda: sheet.row_values(1))
+
+
+def iter_shard_rows(shard: str = DEFAULT_SHARD, page_size: int = 500, start_row: int = 2, deadline: float = None):
+    """Yield (row_number, record) for one shard from `start_row`, reading `page_size` rows per request.
+
+    Paged range reads instead of get_all_records keep memory bounded by one
+    page. Values are numericised like get_all_records; blank rows are skipped.
+    Paging stops at the end of the data, not at the end of the grid (row_count
+    counts empty rows): the API trims trailing empty rows, so a short or empty
+    page is the last one. Every request goes through the circuit breaker, so
+    this raises SheetsUnavailable mid-way if Sheets fails, and DeadlineExceeded
+    rather than start a request that cannot finish by `deadline`.
+    """
+    sheet = breaker.call(lambda: open_shard(shard, deadline))
+    headers = breaker.call(lambda: sheet.row_values(1))
+    if not headers:
+        return
+    width = len(headers)
+    start = max(2, start_row)
+    while True:
+        # Ranges past the grid are rejected, so the last page is clamped to it
+        end = min(start + page_size - 1, sheet.row_count)
+        if end < start:
+            return
+        range_name = f'A{start}:{gspread.utils.rowcol_to_a1(end, width)}'
+        page = breaker.call(lambda: sheet.get(range_name))
+        # An empty range comes back as ValueRange([[]]), which is truthy
+        if not any(page):
+            return
+        for offset, values in enumerate(page):
+            if not any(v not in ('', None) for v in values):
+                continue
+            values = list(values[:width]) + [''] * (width - len(values))
+            yield start + offset, dict(zip(headers, gspread.utils.numericise_all(values, default_blank='')))
+        if len(page) < end - start + 1:
+            return
+        start = end + 1
+
+
+# -- writes -------------------------------------------------------------------
+
+# Appended rows carry the client's request id in column M (after Clinician Notes)
+# so a retried append can tell whether an earlier attempt already landed
+REQUEST_ID_COLUMN = 'M'
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+
+
+def valid_request_id(value) -> bool:
+    return isinstance(value, str) and bool(_REQUEST_ID.match(value))
+
+
+def _already_appended(sheet, request_id: str) -> bool:
+    column = sheet.get(f'{REQUEST_ID_COLUMN}:{REQUEST_ID_COLUMN}')
+    return any(row and row[0] == request_id for row in column)
+
+
+def _apply(entry: dict, deadline: float = None, check: bool = False):
+    """Apply one write. With `check`, an append whose request id is already in the sheet is skipped."""
+    sheet = open_shard(entry.get('shard') or DEFAULT_SHARD, deadline)
+    if entry['op'] == 'append':
+        if check and entry.get('request_id') and _already_appended(sheet, entry['request_id']):
+            return
+        sheet.append_row(entry['row'])
+    elif entry['op'] == 'update':
+        # Clinician Seen, Time Seen, Clinician Notes live in columns J:L. USER_ENTERED
+        # like update_cell, so Time Seen is stored as a date, not text
+        r = int(entry['row_number'])
+        sheet.update([entry['values']], f'J{r}:L{r}', value_input_option=gspread.utils.ValueInputOption.user_entered)
+    else:
+        raise ValueError(f"Unknown journal op: {entry['op']}")
+
+
+def flush_journal(budget: float = None) -> dict:
+    """Replay journaled writes if Sheets looks healthy. Cheap when the journal is empty.
+
+    Every Sheets request made while replaying ends within `budget` seconds.
+    Only SheetsUnavailable keeps an entry queued; entries failing for any
+    other reason (e.g. a bad row number) are dead-lettered and reported.
+    A journaled append may have landed before its call timed out, so appends
+    with a request id are checked against the sheet before being replayed.
+    """
+    if not journal.pending():
+        return {'applied': 0, 'dead_lettered': 0, 'remaining': 0, 'error': None, 'dead_errors': []}
+    if budget is None:
+        budget = _env_number('SHEETS_JOURNAL_REPLAY_BUDGET', 4.0)
+    deadline = time.monotonic() + budget
+    result = journal.replay(lambda entry: breaker.call(lambda: _apply(entry, deadline, check=True)),
+                            budget=budget, retryable=lambda e: isinstance(e, SheetsUnavailable))
+    for error in result['dead_errors']:
+        print(f'Journal entry dead-lettered to {journal.dead_letter_path()}: {error}')
+    return result
+
+
+def write(op: str, shard: str, retry: bool = False, **fields) -> dict:
+    """Apply a sheet write, or journal it while Sheets is unavailable.
+
+    Earlier journaled writes are replayed first so writes land in order. The
+    replay and the write share one time budget (SHEETS_WRITE_BUDGET) that
+    every Sheets request respects; once it is spent the write is journaled
+    without being attempted. Returns {'queued': False} when written, or
+    {'queued': True, 'id': ...} when the write was journaled for later replay.
+
+    `fields` may carry the client's `request_id`: the journal keeps one entry
+    per id, and with `retry` (the client is resending) an append already in
+    the sheet is not written again.
+    """
+    budget = _env_number('SHEETS_WRITE_BUDGET', 10.0)
+    deadline = time.monotonic() + budget
+    entry = {'op': op, 'shard': shard, **fields}
+    # After a write this process must not answer from a warm-start disk snapshot
+    # that predates it; the next read of the shard goes to Sheets
+    with _snapshots_lock:
+        _live_keys.add(_shard_key(shard))
+    replay_budget = min(_env_number('SHEETS_JOURNAL_REPLAY_BUDGET', 4.0), budget)
+    if flush_journal(replay_budget)['remaining'] or deadline - time.monotonic() < MIN_CALL_SECONDS:
+        return {'queued': True, 'id': journal.record(op, shard=shard, **fields)['id']}
+    try:
+        breaker.call(lambda: _apply(entry, deadline, check=retry))
+    except SheetsUnavailable:
+        return {'queued': True, 'id': journal.record(op, shard=shard, **fields)['id']}
+    return {'queued': False}
+
+
+def read_stats() -> dict:
+    return _reads.stats()
+
+
+def breaker_stats() -> dict:
+    return {**breaker.stats(), 'journal_pending': journal.pending(), 'journal_dead_letters': journal.dead_letters()}
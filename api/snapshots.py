@@ -0,0 +1,197 @@
+"""On-disk referral snapshots so a restarted process can serve before its first sheet read.
+
+File layout (little-endian):
+
+    magic   4s   b'RTSS'
+    format  H    FORMAT_VERSION
+    marshal H    marshal.version used for the payload
+    fetched d    epoch seconds of the sheet read
+    version 16s  blake2b digest of the payload (the data version)
+    length  I    payload length in bytes
+    crc     I    crc32 of the payload
+    payload      marshal of (headers tuple, rows tuple of tuples)
+
+Files are written to a temp file in the same directory, fsynced and moved into
+place with os.replace, so readers never see a partial file. Writers hold an
+advisory file lock (fcntl, where available) across the newer-or-equal check
+and the replace, so an older read never replaces a newer one, also across
+processes. On platforms without fcntl only writers within one process are
+ordered. When the data is unchanged only the fetch time in the header is
+refreshed (the checksum covers the payload alone).
+"""
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+try:
+    import fcntl
+    _FCNTL_AVAILABLE = True
+except ImportError:  # Windows dev machines: in-process lock only
+    _FCNTL_AVAILABLE = False
+
+MAGIC = b'RTSS'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHHd16sII')
+_FETCHED_OFFSET = 8  # after magic, format and marshal version
+# Unchanged data refreshes the on-disk fetch time at most this often (seconds)
+TOUCH_INTERVAL = 30.0
+
+_lock = threading.Lock()
+_last = {}  # path -> (records, fetched_at, data version) last written or confirmed by this process
+
+
+class _FileLock:
+    """In-process lock plus an advisory lock on `<path>.lock`."""
+
+    def __init__(self, path: str):
+        self.path = path + '.lock'
+        self._fh = None
+
+    def __enter__(self):
+        _lock.acquire()
+        if _FCNTL_AVAILABLE:
+            try:
+                self._fh = open(self.path, 'a')
+                fcntl.flock(self._fh, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fh is not None:
+                    self._fh.close()
+                    self._fh = None
+                _lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        if self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+        _lock.release()
+
+
+def snapshot_dir() -> str:
+    return os.environ.get('SHEETS_SNAPSHOT_DIR') or tempfile.gettempdir()
+
+
+def snapshot_path(key) -> str:
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(snapshot_dir(), f'referral-snapshot-{digest}.bin')
+
+
+def encode(records: list) -> bytes:
+    """Columnar payload: header names once, then one tuple of values per row."""
+    headers = tuple(records[0].keys()) if records else ()
+    rows = tuple(tuple(r.get(h, '') for h in headers) for r in records)
+    return marshal.dumps((headers, rows))
+
+
+def decode(payload) -> list:
+    headers, rows = marshal.loads(payload)
+    return [dict(zip(headers, row)) for row in rows]
+
+
+def data_version(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def _read_header(path: str):
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(raw) < _HEADER.size:
+        return None
+    header = _HEADER.unpack(raw)
+    if header[0] != MAGIC or header[1] != FORMAT_VERSION or header[2] != marshal.version:
+        return None
+    return header
+
+
+def _touch(path: str, version: bytes, fetched_at: float):
+    """Move the header's fetch time forward if the file still holds `version`."""
+    try:
+        with open(path, 'r+b') as f:
+            header = _HEADER.unpack(f.read(_HEADER.size))
+            if header[0] == MAGIC and header[4] == version and header[3] < fetched_at:
+                f.seek(_FETCHED_OFFSET)
+                f.write(struct.pack('<d', fetched_at))
+    except (OSError, struct.error):
+        pass
+
+
+def save(key, records: list, fetched_at: float) -> bool:
+    """Persist a snapshot; returns False if unchanged or an equal-or-newer one is already on disk.
+
+    Unchanged records (compared with the last save, no re-encoding) only
+    refresh the fetch time, at most every TOUCH_INTERVAL seconds.
+    """
+    path = snapshot_path(key)
+    with _lock:
+        last = _last.get(path)
+    if last is not None and last[0] == records:
+        if fetched_at - last[1] >= TOUCH_INTERVAL:
+            with _FileLock(path):
+                _touch(path, last[2], fetched_at)
+                _last[path] = (records, fetched_at, last[2])
+        return False
+
+    payload = encode(records)
+    version = data_version(payload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _FileLock(path):
+        existing = _read_header(path)
+        if existing is not None and existing[4] == version:
+            _touch(path, version, fetched_at)
+            _last[path] = (records, fetched_at, version)
+            return False
+        if existing is not None and existing[3] >= fetched_at:
+            return False
+        fd, tmp = tempfile.mkstemp(prefix='.referral-snapshot-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, fetched_at, version,
+                                     len(payload), zlib.crc32(payload)))
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        _last[path] = (records, fetched_at, version)
+    return True
+
+
+def load(key):
+    """(records, fetched_at, data_version) from disk, or None if missing, foreign or corrupt."""
+    path = snapshot_path(key)
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, fmt, marshal_version, fetched_at, version, length, crc = _HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or fmt != FORMAT_VERSION or marshal_version != marshal.version:
+                    return None
+                if _HEADER.size + length != size:
+                    return None
+                view = memoryview(mm)[_HEADER.size:]
+                try:
+                    if zlib.crc32(view) != crc:
+                        return None
+                    records = decode(view)
+                finally:
+                    view.release()
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    return records, fetched_at, version
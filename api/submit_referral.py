@@ -1,14 +1,7 @@
 import json
-import os
 from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
 from api.auth import require_auth
-
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
+from api.sheets import shard_for_department, valid_request_id, write
 
 def handler(request):
     # Handle CORS
@@ -70,11 +63,20 @@ def handler(request):
                 'body': json.dumps({'error': f"Missing required fields: {', '.join(missing)}"})
             }
 
-        # Set up Google Sheets connection with scopes
-        credentials_json = json.loads(os.environ['GOOGLE_CREDENTIALS'])
-        credentials = Credentials.from_service_account_info(credentials_json).with_scopes(SCOPES)
-        gc = gspread.authorize(credentials)
-        sheet = gc.open_by_key(os.environ['SHEET_ID']).sheet1
+        # Client-generated id, the same on every resend of this referral
+        request_id = data.get('request_id')
+        if request_id is not None and not valid_request_id(request_id):
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({'error': 'request_id must be 8-64 letters, digits or dashes'})
+            }
+
+        # Write to the receiving department's shard
+        shard = shard_for_department(data['dept_to'])
 
         # Compose row according to the sheet columns
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -92,19 +94,28 @@ def handler(request):
             '',  # Time Seen
             ''   # Clinician Notes
         ]
+        fields = {'row': row}
+        if request_id:
+            row.append(request_id)  # Request ID (column M)
+            fields['request_id'] = request_id
 
-        sheet.append_row(row)
+        # Journaled (202) instead of waiting on Sheets while it is unavailable
+        result = write('append', shard, retry=bool(data.get('retry')), **fields)
 
         return {
-            'statusCode': 200,
+            'statusCode': 202 if result['queued'] else 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
             'body': json.dumps({
                 'success': True,
-                'message': 'Referral submitted successfully',
-                'timestamp': timestamp
+                'message': 'Referral queued; it will be saved when Google Sheets is available' if result['queued']
+                           else 'Referral submitted successfully',
+                'timestamp': timestamp,
+                'shard': shard,
+                'request_id': request_id,
+                'queued': result['queued']
             })
         }
 
@@ -1,14 +1,7 @@
 import json
-import os
 from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
 from api.auth import require_auth
-
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
+from api.sheets import DEFAULT_SHARD, load_shards, valid_request_id, write
 
 def handler(request):
     # Handle CORS
@@ -50,31 +43,59 @@ def handler(request):
                     'body': json.dumps({'error': f'Missing required field: {field}'})
                 }
         
-        # Set up Google Sheets connection
-        credentials_json = json.loads(os.environ['GOOGLE_CREDENTIALS'])
-        credentials = Credentials.from_service_account_info(credentials_json).with_scopes(SCOPES)
-        gc = gspread.authorize(credentials)
-        sheet = gc.open_by_key(os.environ['SHEET_ID']).sheet1
+        # Row 1 is the header; anything else can't be written (and would poison the journal)
+        row_number = data['row_number']
+        if isinstance(row_number, bool) or not isinstance(row_number, int) or row_number < 2:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'row_number must be an integer of at least 2'})
+            }
+
+        # Rows are addressed by (shard, row); no shard means the default sheet
+        shard = data.get('shard') or DEFAULT_SHARD
+        if shard != DEFAULT_SHARD and shard not in load_shards():
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': f'Unknown shard: {shard}'})
+            }
         
+        # Client-generated id, the same on every resend of this update
+        request_id = data.get('request_id')
+        if request_id is not None and not valid_request_id(request_id):
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'request_id must be 8-64 letters, digits or dashes'})
+            }
+
         # Update the specific row
-        row_num = data['row_number']  # This should be the actual row number in the sheet
+        row_num = row_number  # This should be the actual row number in the shard
         time_seen = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        # Update columns J, K, L (Clinician Seen, Time Seen, Clinician Notes)
-        sheet.update_cell(row_num, 10, data['clinician_seen'])  # Column J
-        sheet.update_cell(row_num, 11, time_seen)               # Column K
-        sheet.update_cell(row_num, 12, data.get('clinician_notes', ''))  # Column L
+        # Update columns J, K, L (Clinician Seen, Time Seen, Clinician Notes) in one call;
+        # journaled (202) instead of waiting on Sheets while it is unavailable
+        values = [data['clinician_seen'], time_seen, data.get('clinician_notes', '')]
+        fields = {'row_number': row_num, 'values': values}
+        if request_id:
+            fields['request_id'] = request_id
+        result = write('update', shard, **fields)
         
         return {
-            'statusCode': 200,
+            'statusCode': 202 if result['queued'] else 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Content-Type': 'application/json'
             },
             'body': json.dumps({
                 'success': True,
-                'message': 'Referral updated successfully',
-                'time_seen': time_seen
+                'message': 'Update queued; it will be saved when Google Sheets is available' if result['queued']
+                           else 'Referral updated successfully',
+                'time_seen': time_seen,
+                'shard': shard,
+                'request_id': request_id,
+                'queued': result['queued']
             })
         }
         
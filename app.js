@@ -38,6 +38,18 @@
     }
   }
 
+  // The SW answers from cache first and posts a message once fresher data lands
+  function listenForCacheUpdates() {
+    if (!('serviceWorker' in navigator)) return;
+    navigator.serviceWorker.addEventListener('message', (e) => {
+      const data = e.data || {};
+      // Also sent when unchanged: reloading from the refreshed cache moves "Last updated" on
+      if (data.type !== 'referrals-updated') return;
+      const view = q('#view-dashboard');
+      if (view && !view.hidden && !readFilters().q) loadDashboard();
+    });
+  }
+
   function getFormEl() { return document.getElementById('submit-form'); }
   function getStatusEl() { return document.getElementById('submit-status'); }
   function getSubmitBtn() { return document.getElementById('btn-submit'); }
@@ -95,6 +107,19 @@
     return ok;
   }
 
+  // Idempotency id for one write; resends reuse it so the server can drop duplicates
+  function newRequestId() {
+    if (window.crypto && typeof crypto.randomUUID === 'function') return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+  }
+
+  // Outbox copies are resends of a write that may already have reached the server
+  function enqueueWrite(type, payload) {
+    const headers = getProfileHeaders();
+    const item = { type, payload: { ...payload, retry: true }, headers };
+    return window.AppDB ? window.AppDB.enqueue(item) : Promise.resolve();
+  }
+
   function clearForm() {
     const form = getFormEl();
     form.reset();
@@ -127,47 +152,19 @@
     if (depEl && !depEl.value && profile.department) depEl.value = profile.department;
   }
 
-  function renderList(items) {
+  let dashList = null;
+  function getDashList() {
+    if (dashList) return dashList;
     const listEl = q('#list');
-    if (!listEl) return;
-    if (!items || items.length === 0) {
-      listEl.innerHTML = '<div class="card-item">No referrals found.</div>';
-      return;
-    }
-    const html = items.map(r => {
-      const patient = r['Patient Surname'] || 'Unknown';
-      const ward = r['Ward'] || '-';
-      const bed = r['Bed Number'] || '-';
-      const from = r['Department From'] || '-';
-      const to = r['Department To'] || '-';
-      const urg = (r['Urgency Level'] || '').toLowerCase();
-      const seen = r['Clinician Seen'];
-      const timeSeen = r['Time Seen'];
-      const pillClass = urg === 'high' || urg === 'critical' ? 'danger' : urg === 'medium' ? 'warn' : 'ok';
-      const statusText = seen ? `Seen${timeSeen ? ' • ' + timeSeen : ''}` : 'Pending';
-      const rowNum = r['_row_number'] || '';
-      const action = seen ? '' : `<button class="btn btn-seen" data-row="${rowNum}">Mark Seen</button>`;
-      return `
-        <article class="card-item" data-row="${rowNum}">
-          <div class="item-header">
-            <div class="strong">${patient}</div>
-            <span class="pill ${pillClass}">${r['Urgency Level'] || '—'}</span>
-          </div>
-          <div class="rowline muted">Ward ${ward} • Bed ${bed}</div>
-          <div class="rowline">${from} → ${to}</div>
-          <div class="rowline muted statusline">${statusText}</div>
-          <div class="actions">${action}</div>
-        </article>
-      `;
-    }).join('');
-    listEl.innerHTML = html;
-    // Attach click handlers for Mark Seen (event delegation)
-    listEl.addEventListener('click', (e) => {
-      const btn = e.target.closest('.btn-seen');
-      if (!btn) return;
-      const row = btn.getAttribute('data-row');
-      openSeenModal(row);
-    }, { once: true });
+    if (!listEl || !window.AppList) return null;
+    dashList = window.AppList.createVirtualList(listEl, { onAction: (row, shard) => openSeenModal(row, shard) });
+    return dashList;
+  }
+
+  function renderList(items) {
+    const list = getDashList();
+    if (!list) return;
+    list.setItems(items || []);
   }
 
   let dashboardInitialized = false;
@@ -180,6 +177,15 @@
     }
     const refreshBtn = q('#btn-refresh');
     if (refreshBtn) refreshBtn.addEventListener('click', () => loadDashboard(true));
+    const searchEl = q('#filter_q');
+    if (searchEl) {
+      let timer = 0;
+      searchEl.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => loadDashboard(), 150);
+      });
+    }
+    if (window.AppSearch) window.AppSearch.ready();
 
     // Prefill default department from profile if available
     if (window.AppDB) {
@@ -192,11 +198,41 @@
     }
   }
 
+  // Same semantics as the server-side filters in api/get_referrals.py
+  function filterLocally(records, filters) {
+    let out = records;
+    if (filters.department) {
+      const departments = filters.department.split(',').map(d => d.trim()).filter(Boolean);
+      out = out.filter(r => departments.includes(r['Department To']));
+    }
+    if (filters.ward) out = out.filter(r => r['Ward'] === filters.ward);
+    if (filters.status === 'pending') out = out.filter(r => !r['Clinician Seen']);
+    else if (filters.status === 'seen') out = out.filter(r => r['Clinician Seen']);
+    return out;
+  }
+
+  // Answer free-text queries from the offline index; never hits the network
+  async function searchDashboard(query, filters) {
+    try {
+      const results = filterLocally(await window.AppSearch.search(query), filters);
+      renderList(results);
+      setDashStatus(`${results.length} match${results.length === 1 ? '' : 'es'} in saved referrals.`);
+    } catch {
+      setDashStatus('Search unavailable.', 'error');
+    }
+  }
+
+  // Service-worker copies older than this get a "cached" notice
+  const CACHED_NOTICE_MS = 60 * 1000;
+
   async function loadDashboard(forceNetwork = false) {
     setDashStatus('');
     const filters = readFilters();
+    const query = filters.q;
+    delete filters.q;
+    if (query && window.AppSearch) return searchDashboard(query, filters);
     const key = JSON.stringify(filters || {});
-    const now = new Date();
+    const now = Date.now();
 
     const useCache = async () => {
       try {
@@ -219,15 +255,40 @@
     }
 
     try {
-      const res = await window.AppApi.getReferrals(filters);
+      const res = await window.AppApi.getReferrals(filters, { fresh: forceNetwork });
       if (res && res.success) {
+        // A service-worker cache hit is as old as the stored copy (up to a day), not "now";
+        // the server's own age (stale snapshot, or warm-start snapshot) counts from there
+        const cachedAt = res._cachedAt || 0;
+        const fromSnapshot = res.snapshot_age != null;
+        const serverAge = res.stale_age || res.snapshot_age || 0;
+        const asOf = new Date((cachedAt || now) - serverAge * 1000);
         renderList(res.referrals || []);
         if (window.AppDB) {
           await window.AppDB.cacheReferrals(res.referrals || [], key);
-          await window.AppDB.setMeta('lastUpdated:' + key, Date.now());
+          await window.AppDB.setMeta('lastUpdated:' + key, asOf.getTime());
+        }
+        if (window.AppSearch) {
+          // A current list is authoritative for what it covers: every referral when
+          // unfiltered, otherwise every referral to the departments the server applied
+          // (including its X-Dept-Name default). Indexed rows it lacks are dropped, so a
+          // search hit never points at a row number that now holds another referral.
+          const current = !res.stale && !fromSnapshot && !cachedAt && !filters.ward && !filters.status;
+          const scope = !current ? {}
+            : res.filtered === false ? { complete: true }
+            : { departments: Array.isArray(res.departments) ? res.departments : [] };
+          window.AppSearch.indexReferrals(res.referrals || [], scope).catch(() => {});
+        }
+        setDashUpdated('Last updated: ' + asOf.toLocaleString());
+        if (res.stale) {
+          // Server served its last good snapshot because Google Sheets is unavailable
+          setDashStatus('Google Sheets is unavailable. Showing the last saved data.', 'error');
+        } else if (cachedAt && now - cachedAt > CACHED_NOTICE_MS) {
+          setDashStatus(navigator.onLine ? 'Showing the copy saved on this device. Checking for updates…'
+                                         : 'Offline. Showing the copy saved on this device.', 'error');
+        } else {
+          setDashStatus('');
         }
-        setDashUpdated('Last updated: ' + now.toLocaleString());
-        setDashStatus('');
       } else {
         const hadCache = await useCache();
         if (!hadCache) setDashStatus('Unable to load referrals.', 'error');
@@ -239,10 +300,11 @@
   }
 
   // Seen modal
-  function openSeenModal(row_number) {
+  function openSeenModal(row_number, shard) {
     const modal = q('#modal');
     if (!modal) return;
     q('#seen_row_number').value = row_number || '';
+    q('#seen_shard').value = shard || '';
     q('#seen_status').textContent = '';
     // Prefill clinician
     const clinicianEl = q('#seen_clinician');
@@ -260,41 +322,46 @@
     const onSubmit = async (e) => {
       e.preventDefault();
       const row = q('#seen_row_number').value;
+      const shard = q('#seen_shard').value;
       const clinician = (q('#seen_clinician').value || '').trim();
       const notes = (q('#seen_notes').value || '').trim();
       if (!row || !clinician) {
         q('#seen_status').textContent = 'Clinician is required.';
         return;
       }
-      const payload = { row_number: Number(row), clinician_seen: clinician, clinician_notes: notes };
-
-      const updateUI = (text) => {
-        const card = q(`.card-item[data-row="${row}"] .statusline`);
-        if (card) card.textContent = text;
+      const payload = { row_number: Number(row), clinician_seen: clinician, clinician_notes: notes, request_id: newRequestId() };
+      if (shard) payload.shard = shard;
+
+      // Patch the row in the list model; the renderer redraws it if visible
+      const updateUI = (changes) => {
+        const list = getDashList();
+        if (list) list.update(row, changes, shard);
+        if (window.AppSearch) window.AppSearch.updateReferral(row, changes, shard).catch(() => {});
       };
 
-      const enqueueAndUpdate = async (label) => {
+      const enqueueAndUpdate = async () => {
         try {
-          const headers = getProfileHeaders();
-          await (window.AppDB ? window.AppDB.enqueue({ type: 'update_referral', payload, headers }) : Promise.resolve());
+          await enqueueWrite('update_referral', payload);
           await registerSync();
         } catch {}
-        updateUI(label || 'Seen (pending sync)');
+        updateUI({ 'Clinician Seen': clinician, 'Clinician Notes': notes, _pending: true });
         modal.hidden = true; cleanup();
       };
 
-      if (!navigator.onLine) return enqueueAndUpdate('Seen (pending sync)');
+      if (!navigator.onLine) return enqueueAndUpdate();
 
       try {
         const res = await window.AppApi.updateReferral(payload);
-        if (res && res.success) {
-          updateUI(`Seen • ${res.time_seen || ''}`);
+        if (res && res.success && !res.queued) {
+          updateUI({ 'Clinician Seen': clinician, 'Time Seen': res.time_seen || '', 'Clinician Notes': notes, _pending: false });
           modal.hidden = true; cleanup();
         } else {
-          await enqueueAndUpdate('Seen (pending sync)');
+          // queued: the server only journaled it on its own instance, which can be
+          // recycled; keep the outbox copy until the sheet confirms the update
+          await enqueueAndUpdate();
         }
       } catch {
-        await enqueueAndUpdate('Seen (pending sync)');
+        await enqueueAndUpdate();
       }
     };
 
@@ -365,15 +432,14 @@
 
     const btn = getSubmitBtn();
     btn.disabled = true;
-    const payload = readForm();
+    const payload = { ...readForm(), request_id: newRequestId() };
 
-    const enqueueAndNotify = async () => {
+    const enqueueAndNotify = async (message) => {
       try {
-        const headers = getProfileHeaders();
-        await (window.AppDB ? window.AppDB.enqueue({ type: 'submit_referral', payload, headers }) : Promise.resolve());
+        await enqueueWrite('submit_referral', payload);
         await registerSync();
       } catch {}
-      setStatus('No connection. Saved locally and queued for sync.', 'success');
+      setStatus(message || 'No connection. Saved locally and queued for sync.', 'success');
       clearForm();
     };
 
@@ -385,7 +451,11 @@
 
     try {
       const res = await window.AppApi.submitReferral(payload);
-      if (res && res.success) {
+      if (res && res.success && res.queued) {
+        // The server only journaled it on its own instance, which can be recycled;
+        // the outbox copy is resent (same request_id) until the sheet confirms it
+        await enqueueAndNotify('Google Sheets is unavailable. Saved on this device and will be resent until the sheet confirms it.');
+      } else if (res && res.success) {
         setStatus('Referral submitted successfully.', 'success');
         clearForm();
       } else {
@@ -424,6 +494,7 @@
       }
     })();
     registerSW();
+    listenForCacheUpdates();
     // Attempt to flush any queued actions on load
     setTimeout(() => { registerSync(); }, 0);
 
@@ -451,6 +522,7 @@
           localStorage.removeItem('profile.pin');
           localStorage.removeItem('lastView');
         } catch {}
+        await purgeReferralData();
         showView('login');
       });
     }
@@ -507,6 +579,17 @@
     }
   });
 
+  // Shared ward devices: the next user must not see this user's cached referrals.
+  // Keep the cache name in step with DYNAMIC_CACHE in sw.js.
+  async function purgeReferralData() {
+    try { if ('caches' in window) await caches.delete('referral-dynamic-v1'); } catch {}
+    try { if (window.AppDB) await window.AppDB.clearReferralData(); } catch {}
+    if (window.AppSearch) window.AppSearch.reset();
+    renderList([]);
+    setDashUpdated('');
+    setDashStatus('');
+  }
+
   // Background sync helpers
   function getProfileHeaders() {
     const h = {};
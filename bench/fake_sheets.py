@@ -0,0 +1,372 @@
+"""In-process fake of the Google Sheets v4 endpoints gspread uses.
+
+Implements spreadsheet metadata, values get/update/append/batchGet/batchUpdate
+and spreadsheet batchUpdate (addSheet) against in-memory grids, with
+configurable latency and 429 injection. Point the API handlers at it by
+setting SHEETS_EMULATOR_HOST (see api/sheets.py).
+
+    server = FakeSheetsServer(latency=0.05, rate_429=0.01)
+    server.start()
+    server.seed_referrals('sheet-id', 5000)
+    os.environ['SHEETS_EMULATOR_HOST'] = server.host
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+HEADERS = [
+    'Timestamp', 'Patient Surname', 'Ward', 'Bed Number', 'Referring Clinician',
+    'Department From', 'Department To', 'Urgency Level', 'Referral Notes',
+    'Clinician Seen', 'Time Seen', 'Clinician Notes',
+]
+DEPARTMENTS = ['Emergency', 'Cardiology', 'Surgery', 'Paediatrics', 'Medicine', 'Orthopaedics']
+WARDS = ['1A', '2B', '3A', '4C', 'ICU', 'Maternity']
+URGENCY = ['Low', 'Medium', 'High', 'Critical']
+SURNAMES = ['Smith', 'Nkosi', 'Botha', 'Naidoo', 'Dlamini', 'van der Merwe', 'Pillay', 'Mokoena']
+
+_A1_CELL = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def _col_to_index(letters: str) -> int:
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+
+def _split_range(range_name: str):
+    """Split "'Sheet 1'!A2:L10" into ("Sheet 1", "A2:L10")."""
+    if '!' in range_name:
+        title, a1 = range_name.rsplit('!', 1)
+    else:
+        title, a1 = range_name, ''
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, a1
+
+
+def _parse_a1(a1: str):
+    """Return zero-based (row0, col0, row1, col1) with None for open ends."""
+    if not a1:
+        return 0, 0, None, None
+    start, _, end = a1.partition(':')
+    m1 = _A1_CELL.match(start)
+    m2 = _A1_CELL.match(end or start)
+    if not m1 or not m2:
+        raise ValueError(f'Unable to parse range: {a1}')
+    row0 = int(m1.group(2)) - 1 if m1.group(2) else 0
+    col0 = _col_to_index(m1.group(1)) if m1.group(1) else 0
+    row1 = int(m2.group(2)) if m2.group(2) else None
+    col1 = _col_to_index(m2.group(1)) + 1 if m2.group(1) else None
+    return row0, col0, row1, col1
+
+
+def referral_row(i: int, rng: random.Random, departments=DEPARTMENTS) -> list:
+    seen = rng.random() < 0.4
+    return [
+        f'2025-09-{1 + i % 28:02d} {8 + i % 12:02d}:{i % 60:02d}:00',
+        f'{rng.choice(SURNAMES)} {i}',
+        rng.choice(WARDS),
+        str(1 + i % 40),
+        'Dr Bench',
+        rng.choice(DEPARTMENTS),
+        rng.choice(departments),
+        rng.choice(URGENCY),
+        f'Synthetic referral {i}: review and advise',
+        'Dr Seen' if seen else '',
+        '2025-09-30 12:00:00' if seen else '',
+        '',
+    ]
+
+
+class FakeSheets:
+    """In-memory spreadsheets plus call accounting. Thread-safe."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._books = {}
+        self.calls = {}
+        self.value_input_options = {}  # write kind -> valueInputOption of its last call
+
+    # -- data ---------------------------------------------------------------
+    def create(self, spreadsheet_id: str, sheets=('Sheet1',), title: str = 'Referrals'):
+        with self._lock:
+            self._books[spreadsheet_id] = {
+                'title': title,
+                'sheets': [{'title': t, 'sheetId': i, 'rows': []} for i, t in enumerate(sheets)],
+            }
+
+    def seed_referrals(self, spreadsheet_id: str, rows: int, sheet: str = 'Sheet1', seed: int = 0,
+                       departments=DEPARTMENTS):
+        """Fill a worksheet with synthetic referrals addressed to `departments`."""
+        rng = random.Random(seed)
+        if spreadsheet_id not in self._books:
+            self.create(spreadsheet_id, sheets=(sheet,))
+        with self._lock:
+            book = self._books[spreadsheet_id]
+            if not any(ws['title'] == sheet for ws in book['sheets']):
+                book['sheets'].append({'title': sheet, 'sheetId': len(book['sheets']), 'rows': []})
+        ws = self._sheet(spreadsheet_id, sheet)
+        with self._lock:
+            ws['rows'] = [list(HEADERS)] + [referral_row(i, rng, departments) for i in range(rows)]
+
+    def rows(self, spreadsheet_id: str, sheet: str = 'Sheet1') -> list:
+        with self._lock:
+            return [list(r) for r in self._sheet(spreadsheet_id, sheet)['rows']]
+
+    def _sheet(self, spreadsheet_id: str, title: str):
+        book = self._books.get(spreadsheet_id)
+        if book is None:
+            raise KeyError(spreadsheet_id)
+        for ws in book['sheets']:
+            if ws['title'] == title:
+                return ws
+        raise KeyError(title)
+
+    # -- accounting ---------------------------------------------------------
+    def count(self, kind: str):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.calls)
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = {}
+
+    def should_throttle(self) -> bool:
+        with self._lock:
+            return self.rate_429 > 0 and self._rng.random() < self.rate_429
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+            time.sleep(self.latency + extra)
+
+    # -- API operations -----------------------------------------------------
+    def metadata(self, sid: str) -> dict:
+        with self._lock:
+            book = self._books[sid]
+            return {
+                'spreadsheetId': sid,
+                'properties': {'title': book['title'], 'locale': 'en_US', 'timeZone': 'Etc/GMT'},
+                'sheets': [{
+                    'properties': {
+                        'sheetId': ws['sheetId'],
+                        'title': ws['title'],
+                        'index': i,
+                        'sheetType': 'GRID',
+                        'gridProperties': {
+                            'rowCount': max(1000, len(ws['rows'])),
+                            'columnCount': max(26, max((len(r) for r in ws['rows']), default=0)),
+                        },
+                    }
+                } for i, ws in enumerate(book['sheets'])],
+            }
+
+    def values_get(self, sid: str, range_name: str) -> dict:
+        title, a1 = _split_range(range_name)
+        row0, col0, row1, col1 = _parse_a1(a1)
+        with self._lock:
+            rows = self._sheet(sid, title)['rows']
+            selected = [list(r[col0:col1]) for r in rows[row0:row1]]
+        # The real API trims trailing empty cells and rows
+        for r in selected:
+            while r and r[-1] in ('', None):
+                r.pop()
+        while selected and not selected[-1]:
+            selected.pop()
+        body = {'range': range_name, 'majorDimension': 'ROWS'}
+        if selected:
+            body['values'] = selected
+        return body
+
+    def _write(self, ws: dict, row0: int, col0: int, values: list):
+        rows = ws['rows']
+        for r_off, value_row in enumerate(values):
+            idx = row0 + r_off
+            while len(rows) <= idx:
+                rows.append([])
+            target = rows[idx]
+            need = col0 + len(value_row)
+            if len(target) < need:
+                target.extend([''] * (need - len(target)))
+            for c_off, v in enumerate(value_row):
+                target[col0 + c_off] = '' if v is None else v
+
+    def values_update(self, sid: str, range_name: str, values: list) -> dict:
+        title, a1 = _split_range(range_name)
+        row0, col0, _, _ = _parse_a1(a1)
+        with self._lock:
+            self._write(self._sheet(sid, title), row0, col0, values)
+        cells = sum(len(r) for r in values)
+        return {'spreadsheetId': sid, 'updatedRange': range_name, 'updatedRows': len(values), 'updatedCells': cells}
+
+    def values_append(self, sid: str, range_name: str, values: list) -> dict:
+        title, _ = _split_range(range_name)
+        with self._lock:
+            ws = self._sheet(sid, title)
+            last = len(ws['rows'])
+            while last and not any(c not in ('', None) for c in ws['rows'][last - 1]):
+                last -= 1
+            self._write(ws, last, 0, values)
+        return {
+            'spreadsheetId': sid,
+            'tableRange': f"'{title}'!A1",
+            'updates': {'updatedRange': f"'{title}'!A{last + 1}", 'updatedRows': len(values)},
+        }
+
+    def batch_update(self, sid: str, body: dict) -> dict:
+        replies = []
+        with self._lock:
+            book = self._books[sid]
+            for req in body.get('requests', []):
+                if 'addSheet' in req:
+                    props = req['addSheet'].get('properties', {})
+                    sheet_id = max((ws['sheetId'] for ws in book['sheets']), default=-1) + 1
+                    book['sheets'].append({'title': props.get('title', f'Sheet{sheet_id + 1}'), 'sheetId': sheet_id, 'rows': []})
+                    replies.append({'addSheet': {'properties': {'sheetId': sheet_id, 'title': book['sheets'][-1]['title'], 'index': len(book['sheets']) - 1, 'gridProperties': {'rowCount': 1000, 'columnCount': 26}}}})
+                else:
+                    replies.append({})
+        return {'spreadsheetId': sid, 'replies': replies}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    fake: FakeSheets = None  # set on the server subclass
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (per-call timeout); expected when simulating a slow Sheets
+
+    def _error(self, status: int, message: str, reason: str):
+        self._send(status, {'error': {'code': status, 'message': message, 'status': reason}})
+
+    def _body(self) -> dict:
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw or b'{}')
+
+    def _route(self, method: str):
+        fake = self.fake
+        parsed = urlparse(self.path)
+        # Keep the encoded path: ranges are %-quoted, the ":append" suffix is not
+        m = re.match(r'^/v4/spreadsheets/([^/:]+)(.*)$', parsed.path)
+        if not m:
+            return self._error(404, 'Not found', 'NOT_FOUND')
+        sid, rest = m.group(1), m.group(2)
+        body = self._body() if method in ('POST', 'PUT') else {}
+        query = parse_qs(parsed.query)
+
+        if rest == '':
+            kind = 'metadata'
+        elif rest == ':batchUpdate':
+            kind = 'batchUpdate'
+        elif rest == '/values:batchGet':
+            kind = 'values.batchGet'
+        elif rest == '/values:batchUpdate':
+            kind = 'values.batchUpdate'
+        elif rest.startswith('/values/'):
+            encoded = rest[len('/values/'):]
+            action = ''
+            if ':' in encoded:
+                encoded, action = encoded.rsplit(':', 1)
+            range_name = unquote(encoded)
+            kind = 'values.append' if action == 'append' else ('values.update' if method == 'PUT' else 'values.get')
+        else:
+            return self._error(404, 'Not found', 'NOT_FOUND')
+
+        fake.count(kind)
+        if kind in ('values.update', 'values.append'):
+            fake.value_input_options[kind] = query.get('valueInputOption', [None])[0]
+        fake.delay()
+        if fake.should_throttle():
+            fake.count('429')
+            return self._error(429, 'Quota exceeded for quota metric (fake)', 'RESOURCE_EXHAUSTED')
+
+        try:
+            if kind == 'metadata' and method == 'GET':
+                return self._send(200, fake.metadata(sid))
+            if kind == 'batchUpdate' and method == 'POST':
+                return self._send(200, fake.batch_update(sid, body))
+            if kind == 'values.batchGet' and method == 'GET':
+                ranges = query.get('ranges', [])
+                return self._send(200, {'spreadsheetId': sid, 'valueRanges': [fake.values_get(sid, r) for r in ranges]})
+            if kind == 'values.batchUpdate' and method == 'POST':
+                responses = [fake.values_update(sid, d['range'], d.get('values', [])) for d in body.get('data', [])]
+                return self._send(200, {'spreadsheetId': sid, 'responses': responses})
+            if kind == 'values.get' and method == 'GET':
+                return self._send(200, fake.values_get(sid, range_name))
+            if kind == 'values.update' and method == 'PUT':
+                return self._send(200, fake.values_update(sid, range_name, body.get('values', [])))
+            if kind == 'values.append' and method == 'POST':
+                return self._send(200, fake.values_append(sid, range_name, body.get('values', [])))
+        except KeyError as e:
+            return self._error(404, f'Requested entity was not found: {e}', 'NOT_FOUND')
+        except ValueError as e:
+            return self._error(400, str(e), 'INVALID_ARGUMENT')
+        return self._error(405, 'Method not allowed', 'INVALID_ARGUMENT')
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_PUT(self):
+        self._route('PUT')
+
+
+class FakeSheetsServer(FakeSheets):
+    """FakeSheets served over HTTP on a background thread."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        handler = type('FakeSheetsHandler', (_Handler,), {'fake': self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
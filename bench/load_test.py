@@ -0,0 +1,238 @@
+"""Load-test the API handlers against the fake Sheets server.
+
+Runs each handler in-process at the requested concurrency and sheet sizes and
+reports throughput, latency percentiles and Sheets API calls per request.
+No credentials or network access needed.
+
+    python -m bench.load_test
+    python -m bench.load_test --rows 1000,10000 --concurrency 1,16 --requests 200 \
+        --latency-ms 80 --jitter-ms 40 --rate-429 0.02 --json bench_output.json
+    python -m bench.load_test --endpoints get_referrals --shards 0,4
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_sheets import DEPARTMENTS, WARDS, FakeSheetsServer
+
+SHEET_ID = 'bench-sheet'
+USERNAME = 'bench'
+PASSWORD = 'bench-pass'
+ENDPOINTS = ['get_referrals', 'submit_referral', 'update_referral', 'login']
+
+
+class BenchRequest:
+    def __init__(self, method, body=None, args=None, headers=None):
+        self.method = method
+        self.body = body
+        self.args = args or {}
+        self.headers = headers or {}
+
+
+def configure_env(fake_host: str):
+    os.environ['SHEETS_EMULATOR_HOST'] = fake_host
+    os.environ['SHEET_ID'] = SHEET_ID
+    os.environ.pop('SHEET_SHARDS', None)
+    # Journaled writes and disk snapshots must not leak into the real /tmp files
+    scratch = tempfile.mkdtemp(prefix='bench-sheets-')
+    os.environ['SHEETS_JOURNAL_PATH'] = os.path.join(scratch, 'journal.jsonl')
+    os.environ['SHEETS_SNAPSHOT_DIR'] = scratch
+    os.environ.setdefault('SESSION_SECRET', 'bench-secret')
+    os.environ['APP_PASSWORD'] = PASSWORD
+    os.environ.pop('APP_PASSWORD_BCRYPT', None)
+    os.environ['USERS'] = json.dumps({USERNAME: {'name': 'Dr Bench', 'department': 'Cardiology'}})
+
+
+def make_requests(endpoint: str, rows: int, seed: int):
+    """Return a factory producing the i-th request for an endpoint."""
+    from api.auth import create_session
+
+    cookie = 'session=' + create_session({'u': USERNAME, 'name': 'Dr Bench', 'department': 'Cardiology'})
+    headers = {'Cookie': cookie}
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def pick(seq):
+        with lock:
+            return rng.choice(seq)
+
+    def pick_row():
+        with lock:
+            return rng.randint(2, rows + 1)
+
+    if endpoint == 'get_referrals':
+        variants = [{}, {'department': 'Cardiology'}, {'status': 'pending'}, {'ward': 'ICU', 'status': 'seen'}]
+        return lambda i: BenchRequest('GET', args=variants[i % len(variants)], headers=headers)
+    if endpoint == 'submit_referral':
+        return lambda i: BenchRequest('POST', headers=headers, body=json.dumps({
+            'patient_surname': f'Load {i}',
+            'ward': pick(WARDS),
+            'bed_number': str(1 + i % 40),
+            'dept_to': pick(DEPARTMENTS),
+            'urgency_level': 'Medium',
+            'referral_notes': 'Load test referral',
+        }))
+    if endpoint == 'update_referral':
+        return lambda i: BenchRequest('POST', headers=headers, body=json.dumps({
+            'row_number': pick_row(),
+            'clinician_seen': 'Dr Bench',
+            'clinician_notes': 'Seen during load test',
+        }))
+    if endpoint == 'login':
+        body = json.dumps({'username': USERNAME, 'password': PASSWORD})
+        return lambda i: BenchRequest('POST', body=body)
+    raise ValueError(f'Unknown endpoint: {endpoint}')
+
+
+def get_handler(endpoint: str):
+    if endpoint == 'get_referrals':
+        from api.get_referrals import handler
+    elif endpoint == 'submit_referral':
+        from api.submit_referral import handler
+    elif endpoint == 'update_referral':
+        from api.update_referral import handler
+    elif endpoint == 'login':
+        from api.login import handler
+    else:
+        raise ValueError(f'Unknown endpoint: {endpoint}')
+    return handler
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def seed_sheets(fake, rows: int, shards: int, seed: int):
+    """Spread `rows` over the default sheet plus one worksheet per sharded department."""
+    sharded = DEPARTMENTS[:shards]
+    rest = DEPARTMENTS[shards:]
+    per_dept = rows // len(DEPARTMENTS)
+    fake.seed_referrals(SHEET_ID, rows - per_dept * len(sharded), seed=seed, departments=rest or DEPARTMENTS)
+    for n, dept in enumerate(sharded):
+        fake.seed_referrals(SHEET_ID, per_dept, sheet=dept, seed=seed + n + 1, departments=[dept])
+    if sharded:
+        os.environ['SHEET_SHARDS'] = json.dumps({dept: dept for dept in sharded})
+    else:
+        os.environ.pop('SHEET_SHARDS', None)
+
+
+def run_scenario(fake, endpoint: str, rows: int, concurrency: int, total: int, seed: int, shards: int = 0) -> dict:
+    seed_sheets(fake, rows, shards, seed)
+    handler = get_handler(endpoint)
+    build = make_requests(endpoint, rows, seed)
+    requests_ = [build(i) for i in range(total)]
+    latencies = [0.0] * total
+    statuses = [0] * total
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            res = handler(requests_[i])
+            statuses[i] = (res or {}).get('statusCode', 200)
+        except Exception:
+            statuses[i] = 599
+        latencies[i] = time.perf_counter() - t0
+
+    from api.sheets import read_stats
+
+    fake.reset_counters()
+    coalesced_before = read_stats()['collapsed']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+    calls = fake.snapshot()
+    coalesced = read_stats()['collapsed'] - coalesced_before
+
+    ordered = sorted(latencies)
+    sheets_calls = sum(v for k, v in calls.items() if k != '429')
+    errors = sum(1 for s in statuses if s >= 500)
+    return {
+        'endpoint': endpoint,
+        'rows': rows,
+        'shards': shards,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': total / wall if wall else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        'sheets_calls_per_request': sheets_calls / total if total else 0.0,
+        'throttled_429': calls.get('429', 0),
+        'coalesced': coalesced,
+        'sheets_calls': calls,
+    }
+
+
+def format_table(results) -> str:
+    cols = [
+        ('endpoint', '{:<16}'), ('rows', '{:>7}'), ('shards', '{:>6}'), ('conc', '{:>5}'), ('req/s', '{:>8.1f}'),
+        ('p50 ms', '{:>8.1f}'), ('p95 ms', '{:>8.1f}'), ('p99 ms', '{:>8.1f}'),
+        ('calls/req', '{:>9.2f}'), ('shared', '{:>6}'), ('429s', '{:>5}'), ('errors', '{:>6}'),
+    ]
+    keys = ['endpoint', 'rows', 'shards', 'concurrency', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms',
+            'sheets_calls_per_request', 'coalesced', 'throttled_429', 'errors']
+    header = ' '.join(fmt.replace('.1f', '').replace('.2f', '').format(name) for name, fmt in cols)
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(' '.join(fmt.format(r[k]) for (_, fmt), k in zip(cols, keys)))
+    return '\n'.join(lines)
+
+
+def parse_ints(text: str):
+    return [int(x) for x in text.split(',') if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark API handlers against a fake Sheets server')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma-separated handlers to drive')
+    parser.add_argument('--rows', default='500,5000', help='comma-separated sheet sizes')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma-separated worker counts')
+    parser.add_argument('--shards', default='0',
+                        help='comma-separated counts of departments moved to their own worksheet')
+    parser.add_argument('--requests', type=int, default=100, help='requests per scenario')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='fixed latency per Sheets call')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='extra uniform random latency per call')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='probability a Sheets call returns 429')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='also write results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    fake = FakeSheetsServer(latency=args.latency_ms / 1000.0, jitter=args.jitter_ms / 1000.0,
+                            rate_429=args.rate_429, seed=args.seed).start()
+    configure_env(fake.host)
+    results = []
+    try:
+        for rows in parse_ints(args.rows):
+            for shards in parse_ints(args.shards):
+                for endpoint in [e.strip() for e in args.endpoints.split(',') if e.strip()]:
+                    for concurrency in parse_ints(args.concurrency):
+                        results.append(run_scenario(fake, endpoint, rows, concurrency, args.requests,
+                                                    args.seed, shards))
+                        print(format_table(results[-1:]).splitlines()[-1], flush=True)
+    finally:
+        fake.stop()
+
+    print()
+    print(format_table(results))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
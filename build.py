@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""Build the static app shell into dist/.
+
+Minifies and content-hashes the JS/CSS assets, rewrites index.html to point at
+the hashed names, and emits precache-manifest.js which sw.js imports to decide
+what to (re)download. With --precompress it also writes .br/.gz siblings for
+`dev_server.py --dist`; Vercel compresses static files itself and never serves
+the siblings, so the deployed build leaves them out.
+
+    python build.py                # -> dist/
+    python build.py --out out      # custom output directory
+    python build.py --precompress  # plus .br/.gz siblings for local preview
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+# Optional: better minifiers / brotli if installed, otherwise built-in fallbacks
+try:
+    import rjsmin  # type: ignore
+    _RJSMIN_AVAILABLE = True
+except Exception:
+    rjsmin = None  # type: ignore
+    _RJSMIN_AVAILABLE = False
+
+try:
+    import rcssmin  # type: ignore
+    _RCSSMIN_AVAILABLE = True
+except Exception:
+    rcssmin = None  # type: ignore
+    _RCSSMIN_AVAILABLE = False
+
+try:
+    import brotli  # type: ignore
+    _BROTLI_AVAILABLE = True
+except Exception:
+    brotli = None  # type: ignore
+    _BROTLI_AVAILABLE = False
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HASHED_ASSETS = ['styles.css', 'api.js', 'db.js', 'list.js', 'search.js', 'app.js']
+# Copied as-is under a stable URL; revisioned through the manifest instead
+STABLE_ASSETS = ['index.html', 'manifest.webmanifest', 'sw.js']
+PRECACHE_STABLE = ['/', '/index.html', '/manifest.webmanifest']
+COMPRESS_EXTS = ('.html', '.js', '.css', '.webmanifest', '.json')
+HASH_LEN = 10
+
+_JS_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'instanceof'}
+_JS_TIGHT = set('{}()[];,:=')
+_JS_JOIN_AFTER_NEWLINE = set('{;,([')
+_JS_JOIN_BEFORE_NEWLINE = set('}),;]')
+
+
+def _skip_string(src: str, i: int) -> int:
+    """Return the index just past the quoted string starting at src[i]."""
+    quote = src[i]
+    i += 1
+    while i < len(src):
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def _skip_template(src: str, i: int) -> int:
+    """Return the index just past the template literal starting at src[i]."""
+    i += 1
+    while i < len(src):
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '`':
+            return i + 1
+        if c == '$' and src.startswith('${', i):
+            i = _skip_expression(src, i + 2)
+            continue
+        i += 1
+    return i
+
+
+def _skip_expression(src: str, i: int) -> int:
+    """Skip a ${...} expression body (strings and nested templates included)."""
+    depth = 1
+    while i < len(src) and depth:
+        c = src[i]
+        if c in '\'"':
+            i = _skip_string(src, i)
+            continue
+        if c == '`':
+            i = _skip_template(src, i)
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+        i += 1
+    return i
+
+
+def _skip_regex(src: str, i: int) -> int:
+    """Return the index just past the regex literal body starting at src[i]."""
+    i += 1
+    in_class = False
+    while i < len(src):
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            return i + 1
+        elif c == '\n':
+            return i
+        i += 1
+    return i
+
+
+def _regex_allowed(out: list) -> bool:
+    text = ''.join(out[-12:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in _JS_REGEX_PREFIX:
+        return True
+    m = re.search(r'([A-Za-z_$][\w$]*)$', text)
+    return bool(m and m.group(1) in _JS_REGEX_KEYWORDS)
+
+
+def minify_js(src: str) -> str:
+    """Conservative JS minifier: drops comments and redundant whitespace only.
+
+    Strings, template literals and regex literals are copied verbatim and
+    newlines are kept wherever automatic semicolon insertion might need them.
+    """
+    if _RJSMIN_AVAILABLE and rjsmin is not None:
+        return rjsmin.jsmin(src)
+    out = []
+    i = 0
+    n = len(src)
+    while i < n:
+        c = src[i]
+        if c in '\'"':
+            j = _skip_string(src, i)
+            out.append(src[i:j])
+            i = j
+        elif c == '`':
+            j = _skip_template(src, i)
+            out.append(src[i:j])
+            i = j
+        elif c == '/' and src.startswith('//', i):
+            j = src.find('\n', i)
+            i = n if j < 0 else j
+        elif c == '/' and src.startswith('/*', i):
+            j = src.find('*/', i + 2)
+            i = n if j < 0 else j + 2
+            out.append(' ')
+        elif c == '/' and _regex_allowed(out):
+            j = _skip_regex(src, i)
+            out.append(src[i:j])
+            i = j
+        elif c.isspace():
+            j = i
+            while j < n and src[j].isspace():
+                j += 1
+            out.append('\n' if '\n' in src[i:j] else ' ')
+            i = j
+        else:
+            out.append(c)
+            i += 1
+    return _tighten_js(''.join(out))
+
+
+def _tighten_js(text: str) -> str:
+    # Second pass over collapsed whitespace tokens; literals are opaque here
+    # because whitespace inside them was never collapsed to a lone ' '/'\n'.
+    result = []
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c in '\'"`':
+            j = _skip_string(text, i) if c != '`' else _skip_template(text, i)
+            result.append(text[i:j])
+            i = j
+            continue
+        if c in ' \n':
+            # Merge runs such as ' \n ' produced around removed comments
+            j = i
+            newline = False
+            while j < n and text[j] in ' \n':
+                newline = newline or text[j] == '\n'
+                j += 1
+            prev = result[-1][-1] if result and result[-1] else ''
+            nxt = text[j] if j < n else ''
+            if not prev or not nxt:
+                pass
+            elif newline:
+                if prev not in _JS_JOIN_AFTER_NEWLINE and nxt not in _JS_JOIN_BEFORE_NEWLINE:
+                    result.append('\n')
+            elif prev not in _JS_TIGHT and nxt not in _JS_TIGHT:
+                result.append(' ')
+            i = j
+            continue
+        if c == '/' and _regex_allowed(result):
+            j = _skip_regex(text, i)
+            result.append(text[i:j])
+            i = j
+            continue
+        result.append(c)
+        i += 1
+    return ''.join(result)
+
+
+def minify_css(src: str) -> str:
+    if _RCSSMIN_AVAILABLE and rcssmin is not None:
+        return rcssmin.cssmin(src)
+    text = re.sub(r'/\*.*?\*/', '', src, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    # Only strip around characters that never carry meaning next to spaces;
+    # ':' keeps its leading space so `.a :hover` stays a descendant selector.
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    text = text.replace(';}', '}')
+    return text.strip()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LEN]
+
+
+def hashed_name(name: str, digest: str) -> str:
+    base, ext = os.path.splitext(name)
+    return f'{base}.{digest}{ext}'
+
+
+def write_file(path: str, data: bytes, compress: bool = False) -> list:
+    """Write data plus precompressed siblings; returns the paths written."""
+    with open(path, 'wb') as f:
+        f.write(data)
+    written = [path]
+    if not compress or not path.endswith(COMPRESS_EXTS):
+        return written
+    gz_path = path + '.gz'
+    with open(gz_path, 'wb') as raw:
+        # mtime=0 keeps the output byte-for-byte reproducible
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    written.append(gz_path)
+    if _BROTLI_AVAILABLE and brotli is not None:
+        br_path = path + '.br'
+        with open(br_path, 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        written.append(br_path)
+    return written
+
+
+def rewrite_html(html: str, mapping: dict) -> str:
+    def repl(m):
+        attr, url = m.group(1), m.group(2)
+        return f'{attr}="{mapping.get(url, url)}"'
+    return re.sub(r'\b(src|href)="([^"]+)"', repl, html)
+
+
+def build(out_dir: str, precompress: bool = False) -> dict:
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    mapping = {}
+    assets = []
+    for name in HASHED_ASSETS:
+        with open(os.path.join(ROOT, name), 'r', encoding='utf-8') as f:
+            src = f.read()
+        minified = minify_css(src) if name.endswith('.css') else minify_js(src)
+        data = minified.encode('utf-8')
+        digest = content_hash(data)
+        target = hashed_name(name, digest)
+        write_file(os.path.join(out_dir, target), data, precompress)
+        mapping['/' + name] = '/' + target
+        assets.append({'url': '/' + target, 'revision': None})
+
+    stable_revisions = {}
+    for name in STABLE_ASSETS:
+        with open(os.path.join(ROOT, name), 'rb') as f:
+            data = f.read()
+        if name == 'index.html':
+            data = rewrite_html(data.decode('utf-8'), mapping).encode('utf-8')
+        write_file(os.path.join(out_dir, name), data, precompress)
+        stable_revisions['/' + name] = content_hash(data)
+
+    for url in PRECACHE_STABLE:
+        revision = stable_revisions.get('/index.html' if url == '/' else url)
+        assets.append({'url': url, 'revision': revision})
+
+    # The shell version changes whenever any precached byte changes
+    version = content_hash(json.dumps(assets, sort_keys=True).encode('utf-8'))
+    manifest = {'version': version, 'assets': assets}
+    js = (
+        '// Generated by build.py; do not edit.\n'
+        f'self.PRECACHE_MANIFEST = {json.dumps(manifest, indent=2)};\n'
+    )
+    write_file(os.path.join(out_dir, 'precache-manifest.js'), js.encode('utf-8'), precompress)
+    with open(os.path.join(out_dir, 'asset-manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'files': mapping}, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the static app shell')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'dist'), help='output directory (default: dist/)')
+    parser.add_argument('--precompress', action='store_true',
+                        help='also write .br/.gz siblings (only dev_server.py --dist serves them)')
+    args = parser.parse_args()
+    manifest = build(args.out, args.precompress)
+    print(f"📦 Built {len(manifest['assets'])} precached assets into {args.out} (version {manifest['version']})")
+    if args.precompress and not _BROTLI_AVAILABLE:
+        print("⚠️  brotli not installed; wrote .gz siblings only (pip install brotli for .br)")
+
+
+if __name__ == '__main__':
+    main()
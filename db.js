@@ -1,13 +1,15 @@
-// IndexedDB wrapper and simple stores for profile, cache, outbox, meta.
+// IndexedDB wrapper and simple stores for profile, cache, outbox, meta, search index.
 // Exposes functions on window.AppDB
 (function () {
   const DB_NAME = 'referral-tracker';
-  const DB_VERSION = 1;
+  const DB_VERSION = 2;
   const STORES = {
     profile: { name: 'profile', options: { keyPath: 'key' } },
     referralsCache: { name: 'referralsCache', options: { keyPath: 'key' } },
     outbox: { name: 'outbox', options: { keyPath: 'id', autoIncrement: true } },
     meta: { name: 'meta', options: { keyPath: 'key' } },
+    searchDocs: { name: 'searchDocs', options: { keyPath: 'row' } },
+    searchPostings: { name: 'searchPostings', options: { keyPath: 'token' } },
   };
 
   function openDB() {
@@ -121,6 +123,40 @@
     });
   }
 
+  function getAllCachedReferrals() {
+    return withStore('referralsCache', 'readonly', (store, resolve, reject) => {
+      const req = store.getAll();
+      req.onsuccess = () => resolve((req.result || []).map(e => (e.value && e.value.data) || []));
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  // Search index (docs: row -> record + tokens, postings: token -> rows)
+  function loadSearchIndex() {
+    return openDB().then(db => new Promise((resolve, reject) => {
+      const t = db.transaction(['searchDocs', 'searchPostings'], 'readonly');
+      const docsReq = t.objectStore('searchDocs').getAll();
+      const postingsReq = t.objectStore('searchPostings').getAll();
+      t.oncomplete = () => resolve({ docs: docsReq.result || [], postings: postingsReq.result || [] });
+      t.onerror = () => reject(t.error);
+    }));
+  }
+
+  // Apply one batch of index changes atomically across both stores
+  function writeSearchIndex({ docs = [], postings = [], deletePostings = [], deleteDocs = [] } = {}) {
+    return openDB().then(db => new Promise((resolve, reject) => {
+      const t = db.transaction(['searchDocs', 'searchPostings'], 'readwrite');
+      const docStore = t.objectStore('searchDocs');
+      const postingStore = t.objectStore('searchPostings');
+      docs.forEach(d => docStore.put(d));
+      deleteDocs.forEach(row => docStore.delete(row));
+      postings.forEach(p => postingStore.put(p));
+      deletePostings.forEach(token => postingStore.delete(token));
+      t.oncomplete = () => resolve(true);
+      t.onerror = () => reject(t.error);
+    }));
+  }
+
   // Meta
   function getMeta(key) {
     return withStore('meta', 'readonly', (store, resolve, reject) => {
@@ -138,5 +174,20 @@
     });
   }
 
-  window.AppDB = { getProfile, setProfile, enqueue, dequeue, cacheReferrals, getCachedReferrals, getMeta, setMeta };
+  // Drop every stored copy of patient data (on logout). The outbox is kept: it holds
+  // writes that have not reached the sheet yet.
+  function clearReferralData() {
+    const names = ['referralsCache', 'meta', 'searchDocs', 'searchPostings'];
+    return openDB().then(db => new Promise((resolve, reject) => {
+      const t = db.transaction(names, 'readwrite');
+      names.forEach(name => t.objectStore(name).clear());
+      t.oncomplete = () => resolve(true);
+      t.onerror = () => reject(t.error);
+    }));
+  }
+
+  window.AppDB = {
+    getProfile, setProfile, enqueue, dequeue, cacheReferrals, getCachedReferrals, getAllCachedReferrals,
+    loadSearchIndex, writeSearchIndex, getMeta, setMeta, clearReferralData
+  };
 })();
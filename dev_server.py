@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
+import argparse
+import functools
 import json
+import mimetypes
 import os
 from http.server import SimpleHTTPRequestHandler, HTTPServer
 from urllib.parse import urlparse, parse_qs
 
+# dev_server.py writes iterator bodies chunk by chunk (see do_GET)
+os.environ.setdefault('EXPORT_STREAMING', '1')
+
 # Import API handlers
 from api.submit_referral import handler as submit_handler
 from api.get_referrals import handler as get_handler
 from api.update_referral import handler as update_handler
+from api.export import handler as export_handler
 
 
 class RequestWrapper:
@@ -27,11 +34,39 @@ def call_api_handler(path, method, body, query_params, headers):
         return get_handler(request)
     elif path == "/api/update_referral":
         return update_handler(request)
+    elif path == "/api/export":
+        return export_handler(request)
     else:
         return None
 
 
 class DevHandler(SimpleHTTPRequestHandler):
+    # Set by run(); when serving a build, prefer its precompressed .br/.gz siblings
+    # (written by `build.py --precompress`; the Vercel build has none)
+    precompressed = False
+
+    def _serve_precompressed(self):
+        accept = self.headers.get('Accept-Encoding', '')
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, 'index.html')
+        if not os.path.isfile(path):
+            return False
+        for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+            candidate = path + ext
+            if encoding in accept and os.path.isfile(candidate):
+                with open(candidate, 'rb') as f:
+                    data = f.read()
+                self.send_response(200)
+                self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+                self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                self.wfile.write(data)
+                return True
+        return False
+
     def _handle_api(self):
         parsed = urlparse(self.path)
         path = parsed.path
@@ -60,6 +95,20 @@ class DevHandler(SimpleHTTPRequestHandler):
             if body_text and 'Content-Type' not in {k.title(): k for k in resp_headers.keys()}:
                 self.send_header('Content-Type', 'application/json')
             self.end_headers()
+            if body_text and not isinstance(body_text, (str, bytes)):
+                # Streaming body (e.g. /api/export): write chunks as they are produced.
+                # HTTP/1.0 without Content-Length: the response ends when the connection closes.
+                self.close_connection = True
+                try:
+                    for chunk in body_text:
+                        self.wfile.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                except Exception as e:
+                    # Status and headers are already sent; all we can do is cut the stream
+                    self.log_error('stream aborted: %s', e)
+                return True
             if body_text:
                 self.wfile.write(body_text.encode('utf-8'))
             return True
@@ -78,6 +127,8 @@ class DevHandler(SimpleHTTPRequestHandler):
     def do_GET(self):
         if self._handle_api():
             return
+        if self.precompressed and self._serve_precompressed():
+            return
         return super().do_GET()
 
     def do_POST(self):
@@ -87,6 +138,10 @@ class DevHandler(SimpleHTTPRequestHandler):
         self.send_error(404, "Not Found")
 
 
+class DistHandler(DevHandler):
+    precompressed = True
+
+
 def ensure_env():
     # Auto-load service account if not set
     if 'GOOGLE_CREDENTIALS' not in os.environ and os.path.exists('service-account.json'):
@@ -97,15 +152,25 @@ def ensure_env():
         print("⚠️  SHEET_ID not set. Set it via environment to enable API calls.")
 
 
-def run(port=8000):
+def run(port=8000, directory=None):
     ensure_env()
     server_address = ('', port)
-    httpd = HTTPServer(server_address, DevHandler)
+    handler = DevHandler
+    if directory:
+        # Serve a build (see build.py) instead of the source tree
+        handler = functools.partial(DistHandler, directory=directory)
+    httpd = HTTPServer(server_address, handler)
     print(f"📟 Dev server running at http://localhost:{port}")
     print("   • Serves static files and routes /api/* to Python handlers")
+    if directory:
+        print(f"   • Static files from {directory} (precompressed .br/.gz when accepted and built with --precompress)")
     httpd.serve_forever()
 
 
 if __name__ == '__main__':
-    run()
+    parser = argparse.ArgumentParser(description='Local dev server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--dist', action='store_true', help='serve the build output in dist/ (run build.py --precompress first)')
+    args = parser.parse_args()
+    run(args.port, 'dist' if args.dist else None)
 
@@ -0,0 +1,237 @@
+// Windowed (virtualized) list renderer for the dashboard. Exposes window.AppList
+// Only cards inside the viewport (plus a small overscan) exist in the DOM.
+// Incoming data is diffed by `_row_number`; unchanged cards keep their element.
+(function () {
+  const OVERSCAN = 6;
+  const GAP = 10; // matches `.list { gap: 10px }`
+  const DEFAULT_ROW_HEIGHT = 150;
+  const SIG_FIELDS = [
+    'Patient Surname', 'Ward', 'Bed Number', 'Department From', 'Department To',
+    'Urgency Level', 'Clinician Seen', 'Time Seen', '_pending', '_shard'
+  ];
+
+  // Rows are unique per shard; unsharded rows keep the bare row number
+  function rowKey(row, shard) {
+    return shard ? `${shard}:${row}` : String(row);
+  }
+
+  function keyOf(r, i) {
+    const row = r ? r['_row_number'] : null;
+    return row != null && row !== '' ? rowKey(row, r['_shard']) : 'idx:' + i;
+  }
+
+  function signature(r) {
+    return SIG_FIELDS.map(f => (r && r[f] != null ? String(r[f]) : '')).join('\u0001');
+  }
+
+  function createCard() {
+    const el = document.createElement('article');
+    el.className = 'card-item';
+    el.innerHTML = `
+      <div class="item-header">
+        <div class="strong" data-f="patient"></div>
+        <span class="pill" data-f="urgency"></span>
+      </div>
+      <div class="rowline muted" data-f="location"></div>
+      <div class="rowline" data-f="route"></div>
+      <div class="rowline muted statusline" data-f="status"></div>
+      <div class="actions"><button class="btn btn-seen" type="button">Mark Seen</button></div>
+    `;
+    el._f = {};
+    el.querySelectorAll('[data-f]').forEach(n => { el._f[n.dataset.f] = n; });
+    el._f.action = el.querySelector('.btn-seen');
+    return el;
+  }
+
+  function fillCard(el, r) {
+    const f = el._f;
+    const urg = (r['Urgency Level'] || '').toLowerCase();
+    const seen = r['Clinician Seen'];
+    const timeSeen = r['Time Seen'];
+    const rowNum = r['_row_number'] || '';
+    let statusText = 'Pending';
+    if (r._pending) statusText = 'Seen (pending sync)';
+    else if (seen) statusText = `Seen${timeSeen ? ' • ' + timeSeen : ''}`;
+
+    el.dataset.row = rowNum;
+    el.dataset.shard = r['_shard'] || '';
+    f.patient.textContent = r['Patient Surname'] || 'Unknown';
+    f.urgency.textContent = r['Urgency Level'] || '—';
+    f.urgency.className = 'pill ' + (urg === 'high' || urg === 'critical' ? 'danger' : urg === 'medium' ? 'warn' : 'ok');
+    f.location.textContent = `Ward ${r['Ward'] || '-'} • Bed ${r['Bed Number'] || '-'}`;
+    f.route.textContent = `${r['Department From'] || '-'} → ${r['Department To'] || '-'}`;
+    f.status.textContent = statusText;
+    f.action.dataset.row = rowNum;
+    f.action.dataset.shard = r['_shard'] || '';
+    // Keep the button slot so every card has the same height
+    f.action.style.visibility = seen || r._pending ? 'hidden' : '';
+  }
+
+  function createVirtualList(container, options = {}) {
+    const onAction = options.onAction || null;
+    const scroller = options.scroller || window;
+    let items = [];
+    let keys = [];
+    let sigs = new Map();      // key -> signature of the current data
+    let indexByKey = new Map(); // key -> index into items
+    const rendered = new Map(); // key -> { el, sig }
+    const pool = [];
+    let rowHeight = 0;
+    let frame = 0;
+    let emptyEl = null;
+
+    container.classList.add('vlist');
+    container.textContent = '';
+
+    function measure() {
+      const probe = createCard();
+      fillCard(probe, { 'Patient Surname': 'Probe', 'Urgency Level': 'Low' });
+      probe.style.visibility = 'hidden';
+      container.appendChild(probe);
+      const h = probe.offsetHeight;
+      container.removeChild(probe);
+      pool.push(probe);
+      // A hidden view measures 0; fall back until the next resize/render
+      rowHeight = h > 0 ? h + GAP : 0;
+    }
+
+    function stride() {
+      if (!rowHeight) measure();
+      return rowHeight || DEFAULT_ROW_HEIGHT;
+    }
+
+    function viewportRange(h) {
+      const rect = container.getBoundingClientRect();
+      const viewTop = scroller === window ? 0 : scroller.getBoundingClientRect().top;
+      const viewHeight = scroller === window ? window.innerHeight : scroller.clientHeight;
+      const offset = viewTop - rect.top;
+      const start = Math.max(0, Math.floor(offset / h) - OVERSCAN);
+      const end = Math.min(items.length, Math.ceil((offset + viewHeight) / h) + OVERSCAN);
+      return [start, Math.max(start, end)];
+    }
+
+    function release(key) {
+      const entry = rendered.get(key);
+      if (!entry) return;
+      rendered.delete(key);
+      entry.el.remove();
+      pool.push(entry.el);
+    }
+
+    function renderWindow() {
+      if (!items.length) {
+        rendered.forEach((_, key) => release(key));
+        container.style.height = '';
+        if (!emptyEl) {
+          emptyEl = document.createElement('div');
+          emptyEl.className = 'card-item empty';
+          emptyEl.textContent = 'No referrals found.';
+        }
+        if (!emptyEl.isConnected) container.appendChild(emptyEl);
+        return;
+      }
+      if (emptyEl && emptyEl.isConnected) emptyEl.remove();
+
+      const h = stride();
+      container.style.height = (items.length * h - GAP) + 'px';
+      const [start, end] = viewportRange(h);
+
+      // Drop cards that scrolled out of the window or no longer exist
+      rendered.forEach((entry, key) => {
+        const i = indexByKey.get(key);
+        if (i === undefined || i < start || i >= end) release(key);
+      });
+
+      const fragment = document.createDocumentFragment();
+      for (let i = start; i < end; i++) {
+        const key = keys[i];
+        const sig = sigs.get(key);
+        let entry = rendered.get(key);
+        if (!entry) {
+          entry = { el: pool.pop() || createCard(), sig: null, top: -1 };
+          rendered.set(key, entry);
+          fragment.appendChild(entry.el);
+        }
+        if (entry.sig !== sig) {
+          fillCard(entry.el, items[i]);
+          entry.sig = sig;
+        }
+        const top = i * h;
+        if (entry.top !== top) {
+          entry.el.style.transform = `translateY(${top}px)`;
+          entry.top = top;
+        }
+      }
+      if (fragment.firstChild) container.appendChild(fragment);
+    }
+
+    function schedule() {
+      if (frame) return;
+      frame = requestAnimationFrame(() => { frame = 0; renderWindow(); });
+    }
+
+    // Replace the data set; returns counts of added/changed/removed rows.
+    function setItems(next) {
+      const prevSigs = sigs;
+      items = Array.isArray(next) ? next.slice() : [];
+      keys = new Array(items.length);
+      sigs = new Map();
+      indexByKey = new Map();
+      let added = 0;
+      let changed = 0;
+      for (let i = 0; i < items.length; i++) {
+        const key = keyOf(items[i], i);
+        const sig = signature(items[i]);
+        keys[i] = key;
+        sigs.set(key, sig);
+        indexByKey.set(key, i);
+        const prev = prevSigs.get(key);
+        if (prev === undefined) added++;
+        else if (prev !== sig) changed++;
+      }
+      let removed = 0;
+      prevSigs.forEach((_, key) => { if (!sigs.has(key)) removed++; });
+      renderWindow();
+      return { added, changed, removed, total: items.length };
+    }
+
+    // Patch a single row in place (e.g. after Mark Seen) without a reload.
+    function update(rowNumber, changes, shard) {
+      const key = rowKey(rowNumber, shard);
+      const i = indexByKey.get(key);
+      if (i === undefined) return false;
+      items[i] = { ...items[i], ...(changes || {}) };
+      sigs.set(key, signature(items[i]));
+      schedule();
+      return true;
+    }
+
+    function getItems() { return items; }
+
+    function onResize() { rowHeight = 0; schedule(); }
+
+    function onClick(e) {
+      const btn = e.target.closest('.btn-seen');
+      if (!btn || !onAction) return;
+      onAction(btn.getAttribute('data-row'), btn.getAttribute('data-shard') || '');
+    }
+
+    scroller.addEventListener('scroll', schedule, { passive: true });
+    window.addEventListener('resize', onResize);
+    container.addEventListener('click', onClick);
+
+    function destroy() {
+      if (frame) cancelAnimationFrame(frame);
+      scroller.removeEventListener('scroll', schedule);
+      window.removeEventListener('resize', onResize);
+      container.removeEventListener('click', onClick);
+      rendered.forEach((_, key) => release(key));
+      container.classList.remove('vlist');
+      container.style.height = '';
+    }
+
+    return { setItems, update, getItems, refresh: schedule, renderNow: renderWindow, destroy };
+  }
+
+  window.AppList = { createVirtualList, rowKey };
+})();
@@ -0,0 +1,197 @@
+// Offline search over cached referrals. Exposes window.AppSearch
+// Keeps an inverted index (token -> row numbers) in memory, persisted to
+// IndexedDB via AppDB so queries never need a round-trip to /api/get_referrals.
+(function () {
+  const FIELDS = {
+    'Patient Surname': 1,
+    'Ward': 1,
+    'Bed Number': 1,
+    'Referral Notes': 2,
+    'Clinician Notes': 2,
+  };
+
+  const postings = new Map(); // token -> Set(key)
+  const docs = new Map();     // key -> { row: key, tokens, record }
+  let sortedTokens = null;    // lazily rebuilt for prefix lookups
+  let loading = null;
+
+  function normalize(text) {
+    return String(text == null ? '' : text)
+      .normalize('NFKD')
+      .replace(/[\u0300-\u036f]/g, '')
+      .toLowerCase();
+  }
+
+  // Identifying fields keep every token; free-text notes drop 1-char noise.
+  function tokenize(text, minLength = 1) {
+    return normalize(text).split(/[^a-z0-9]+/).filter(t => t.length >= minLength);
+  }
+
+  function tokensFor(record) {
+    const out = new Set();
+    Object.entries(FIELDS).forEach(([field, minLength]) => {
+      tokenize(record[field], minLength).forEach(t => out.add(t));
+    });
+    return Array.from(out).sort();
+  }
+
+  // Row numbers repeat across shards, so sharded rows are keyed "shard:row".
+  // Unsharded rows keep the numeric key used before sharding existed.
+  function docKey(row, shard) {
+    const n = Number(row);
+    if (!Number.isFinite(n)) return null;
+    return shard ? `${shard}:${n}` : n;
+  }
+
+  function keyOf(record) {
+    return record ? docKey(record['_row_number'], record['_shard']) : null;
+  }
+
+  function ready() {
+    if (loading) return loading;
+    loading = (async () => {
+      if (!window.AppDB) return;
+      try {
+        const stored = await window.AppDB.loadSearchIndex();
+        stored.postings.forEach(p => postings.set(p.token, new Set(p.rows)));
+        stored.docs.forEach(d => docs.set(d.row, d));
+        sortedTokens = null;
+        // First run after upgrade: seed from whatever the dashboard already cached
+        if (!docs.size) {
+          const lists = await window.AppDB.getAllCachedReferrals();
+          for (const list of lists) await apply(list);
+        }
+      } catch {}
+    })();
+    return loading;
+  }
+
+  function addPosting(token, row, touched) {
+    let rows = postings.get(token);
+    if (!rows) { rows = new Set(); postings.set(token, rows); sortedTokens = null; }
+    rows.add(row);
+    touched.add(token);
+  }
+
+  function removePosting(token, row, touched) {
+    const rows = postings.get(token);
+    if (!rows) return;
+    rows.delete(row);
+    if (!rows.size) { postings.delete(token); sortedTokens = null; }
+    touched.add(token);
+  }
+
+  // Upsert records into the index; only rows whose tokens or content changed are written.
+  // `complete` means the list is the whole data set (an unfiltered fetch), and
+  // `departments` that it holds every referral to those departments; indexed rows
+  // in that scope missing from it were deleted or shifted and are dropped.
+  async function apply(list, { complete = false, departments = null } = {}) {
+    const touched = new Set();
+    const changedDocs = [];
+    const removedDocs = [];
+    const scope = !complete && departments && departments.length ? new Set(departments) : null;
+    const present = complete || scope ? new Set() : null;
+    (list || []).forEach(record => {
+      const row = keyOf(record);
+      if (row === null) return;
+      if (present) present.add(row);
+      const tokens = tokensFor(record);
+      const prev = docs.get(row);
+      const prevTokens = prev ? prev.tokens : [];
+      const sameTokens = prevTokens.length === tokens.length && prevTokens.every((t, i) => t === tokens[i]);
+      if (prev && sameTokens && JSON.stringify(prev.record) === JSON.stringify(record)) return;
+      if (!sameTokens) {
+        const next = new Set(tokens);
+        prevTokens.forEach(t => { if (!next.has(t)) removePosting(t, row, touched); });
+        tokens.forEach(t => addPosting(t, row, touched));
+      }
+      const doc = { row, tokens, record };
+      docs.set(row, doc);
+      changedDocs.push(doc);
+    });
+    if (present) {
+      docs.forEach((doc, row) => {
+        if (present.has(row)) return;
+        if (scope && !scope.has(doc.record['Department To'])) return;
+        doc.tokens.forEach(t => removePosting(t, row, touched));
+        docs.delete(row);
+        removedDocs.push(row);
+      });
+    }
+    const changes = changedDocs.length + removedDocs.length;
+    if (!changes || !window.AppDB) return changes;
+    const put = [];
+    const del = [];
+    touched.forEach(token => {
+      const rows = postings.get(token);
+      if (rows) put.push({ token, rows: Array.from(rows) });
+      else del.push(token);
+    });
+    try {
+      await window.AppDB.writeSearchIndex({ docs: changedDocs, postings: put, deletePostings: del, deleteDocs: removedDocs });
+    } catch {}
+    return changes;
+  }
+
+  // Pass { complete: true } when `list` is an unfiltered fetch of every referral, or
+  // { departments } when it is every referral to those departments.
+  async function indexReferrals(list, options) {
+    await ready();
+    return apply(list, options);
+  }
+
+  // Apply a local edit (e.g. Mark Seen) to an indexed row.
+  async function updateReferral(rowNumber, changes, shard) {
+    await ready();
+    const doc = docs.get(docKey(rowNumber, shard));
+    if (!doc) return false;
+    await apply([{ ...doc.record, ...(changes || {}) }]);
+    return true;
+  }
+
+  function tokensWithPrefix(prefix) {
+    if (!sortedTokens) sortedTokens = Array.from(postings.keys()).sort();
+    let lo = 0;
+    let hi = sortedTokens.length;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (sortedTokens[mid] < prefix) lo = mid + 1; else hi = mid;
+    }
+    const out = [];
+    for (let i = lo; i < sortedTokens.length && sortedTokens[i].startsWith(prefix); i++) out.push(sortedTokens[i]);
+    return out;
+  }
+
+  function rowsFor(term, prefix) {
+    if (!prefix) return postings.get(term) || new Set();
+    const out = new Set();
+    tokensWithPrefix(term).forEach(t => postings.get(t).forEach(r => out.add(r)));
+    return out;
+  }
+
+  // Every term must match; the last term also matches as a prefix (search-as-you-type).
+  async function search(query, { limit = 500, prefix = true } = {}) {
+    await ready();
+    const terms = Array.from(new Set(tokenize(query)));
+    if (!terms.length) return [];
+    const sets = terms.map((t, i) => rowsFor(t, prefix && i === terms.length - 1));
+    sets.sort((a, b) => a.size - b.size);
+    const hits = [];
+    sets[0].forEach(row => { if (sets.every(s => s.has(row))) hits.push(row); });
+    const rowNumber = key => Number(docs.get(key).record['_row_number']) || 0;
+    hits.sort((a, b) => rowNumber(b) - rowNumber(a)); // newest rows first
+    return hits.slice(0, limit).map(key => docs.get(key).record);
+  }
+
+  function size() { return docs.size; }
+
+  // Forget the in-memory index (on logout, after AppDB.clearReferralData)
+  function reset() {
+    postings.clear();
+    docs.clear();
+    sortedTokens = null;
+    loading = null;
+  }
+
+  window.AppSearch = { ready, indexReferrals, updateReferral, search, size, tokenize, reset };
+})();
@@ -1,26 +1,52 @@
-const CACHE_NAME = 'referral-shell-v2';
-const APP_SHELL = [
+// Builds (python build.py) ship precache-manifest.js with content-hashed URLs and
+// a version derived from them. Serving the repo root directly falls back to the
+// plain file list and the manual version below.
+try { importScripts('/precache-manifest.js'); } catch (e) {}
+const PRECACHE = self.PRECACHE_MANIFEST || null;
+const CACHE_NAME = PRECACHE ? `referral-shell-${PRECACHE.version}` : 'referral-shell-v10';
+const APP_SHELL = PRECACHE ? PRECACHE.assets.map(a => a.url) : [
   '/',
   '/index.html',
   '/styles.css',
   '/app.js',
   '/api.js',
   '/db.js',
+  '/list.js',
+  '/search.js',
   '/manifest.webmanifest',
 ];
+// Hashed URLs never change content, so they can be reused from an older shell cache
+const IMMUTABLE_SHELL = new Set(PRECACHE ? PRECACHE.assets.filter(a => !a.revision).map(a => a.url) : []);
 
-// IndexedDB helpers for SW (outbox only)
+// Runtime cache for API reads: stale-while-revalidate, bounded by entries, bytes and age
+const DYNAMIC_CACHE = 'referral-dynamic-v1';
+const DYNAMIC_MAX_ENTRIES = 30;
+const DYNAMIC_MAX_BYTES = 5 * 1024 * 1024;
+const DYNAMIC_MAX_AGE = 24 * 60 * 60 * 1000;
+const REVALIDATE_MIN_INTERVAL = 5 * 1000;
+const revalidating = new Map(); // cache key -> in-flight network fetch
+
+// IndexedDB helpers for SW (outbox only). Keep version and stores in step with db.js:
+// whichever context opens the DB first runs the upgrade for both.
 const DB_NAME = 'referral-tracker';
-const DB_VERSION = 1;
+const DB_VERSION = 2;
+const DB_STORES = {
+  profile: { keyPath: 'key' },
+  referralsCache: { keyPath: 'key' },
+  outbox: { keyPath: 'id', autoIncrement: true },
+  meta: { keyPath: 'key' },
+  searchDocs: { keyPath: 'row' },
+  searchPostings: { keyPath: 'token' },
+};
 
 function openDB() {
   return new Promise((resolve, reject) => {
     const req = indexedDB.open(DB_NAME, DB_VERSION);
     req.onupgradeneeded = () => {
       const db = req.result;
-      if (!db.objectStoreNames.contains('outbox')) {
-        db.createObjectStore('outbox', { keyPath: 'id', autoIncrement: true });
-      }
+      Object.entries(DB_STORES).forEach(([name, options]) => {
+        if (!db.objectStoreNames.contains(name)) db.createObjectStore(name, options);
+      });
     };
     req.onsuccess = () => resolve(req.result);
     req.onerror = () => reject(req.error);
@@ -76,19 +102,168 @@ async function syncOutbox() {
     hdrs.set('Content-Type', 'application/json');
     const res = await fetch(url, { method: 'POST', headers: hdrs, body: JSON.stringify(payload || {}) });
     if (!res.ok) throw new Error('Sync failed: ' + res.status);
+    // 202 / queued: the server only journaled it in its instance's /tmp, which can be
+    // lost. Keep the entry; the resend carries the same request_id, so it is not duplicated.
+    const data = await res.json().catch(() => ({}));
+    if (res.status === 202 || data.queued) throw new Error('Sync pending: server queued the write');
     await removeOutbox(id);
   }
 }
 
-self.addEventListener('install', (event) => {
-  event.waitUntil(
-    caches.open(CACHE_NAME).then((cache) => cache.addAll(APP_SHELL))
+// One cache entry per filter combination. The server defaults the department
+// filter from X-Dept-Name, so that header is part of the key too.
+function referralsCacheKey(req) {
+  const url = new URL(req.url);
+  const params = new URLSearchParams(
+    Array.from(url.searchParams.entries()).sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0))
   );
+  const dept = req.headers.get('X-Dept-Name');
+  if (dept) params.set('__dept', dept);
+  return `${url.origin}${url.pathname}?${params.toString()}`;
+}
+
+function cachedAt(res) {
+  return Number(res.headers.get('sw-cached-at')) || 0;
+}
+
+function sameBytes(a, b) {
+  if (!a || !b || a.byteLength !== b.byteLength) return false;
+  const x = new Uint8Array(a);
+  const y = new Uint8Array(b);
+  for (let i = 0; i < x.length; i++) if (x[i] !== y[i]) return false;
+  return true;
+}
+
+function toResponse(entry) {
+  return new Response(entry.body, { status: entry.status, statusText: entry.statusText, headers: entry.headers });
+}
+
+// A cache hit tells the page when the copy was stored, so it is not shown as live data
+async function fromCache(cached) {
+  const headers = new Headers(cached.headers);
+  headers.set('X-SW-Cached-At', String(cachedAt(cached)));
+  return new Response(await cached.arrayBuffer(), { status: cached.status, statusText: cached.statusText, headers });
+}
+
+// Cache.keys() keeps insertion order, so delete + put moves an entry to the
+// most-recently-used end and trimming can walk from the front.
+async function storeDynamic(key, entry) {
+  const headers = new Headers(entry.headers);
+  headers.set('sw-cached-at', String(Date.now()));
+  headers.set('sw-size', String(entry.body.byteLength));
+  const cache = await caches.open(DYNAMIC_CACHE);
+  await cache.delete(key);
+  await cache.put(key, new Response(entry.body, { status: entry.status, statusText: entry.statusText, headers }));
+}
+
+async function trimDynamicCache() {
+  const cache = await caches.open(DYNAMIC_CACHE);
+  const keys = await cache.keys();
+  const now = Date.now();
+  const live = [];
+  let total = 0;
+  for (const k of keys) {
+    const res = await cache.match(k);
+    if (!res || now - cachedAt(res) > DYNAMIC_MAX_AGE) {
+      await cache.delete(k);
+      continue;
+    }
+    const size = Number(res.headers.get('sw-size')) || 0;
+    live.push({ k, size });
+    total += size;
+  }
+  while (live.length && (live.length > DYNAMIC_MAX_ENTRIES || total > DYNAMIC_MAX_BYTES)) {
+    const { k, size } = live.shift();
+    total -= size;
+    await cache.delete(k);
+  }
+}
+
+async function broadcast(message) {
+  const clients = await self.clients.matchAll({ type: 'window' });
+  clients.forEach(c => c.postMessage(message));
+}
+
+// Fetch from the network once per key at a time; concurrent callers share it.
+function revalidate(req, key, previousBody) {
+  if (revalidating.has(key)) return revalidating.get(key);
+  const pending = (async () => {
+    const res = await fetch(req);
+    const entry = {
+      body: await res.arrayBuffer(),
+      status: res.status,
+      statusText: res.statusText,
+      headers: new Headers(res.headers),
+    };
+    // A server-side stale snapshot (Sheets down) must not replace a copy we already have
+    const staleSnapshot = res.headers.get('X-Data-Stale') === '1';
+    if (res.ok && !(staleSnapshot && previousBody)) {
+      await storeDynamic(key, entry);
+      trimDynamicCache().catch(() => {});
+      // Sent even when unchanged, so the page can move its "Last updated" time on
+      if (previousBody) {
+        await broadcast({ type: 'referrals-updated', url: req.url, changed: !sameBytes(previousBody, entry.body) });
+      }
+    }
+    return entry;
+  })();
+  revalidating.set(key, pending);
+  pending.then(() => revalidating.delete(key), () => revalidating.delete(key));
+  return pending;
+}
+
+async function staleWhileRevalidate(event) {
+  const req = event.request;
+  const key = referralsCacheKey(req);
+  const cache = await caches.open(DYNAMIC_CACHE);
+  let cached = await cache.match(key);
+  if (cached && Date.now() - cachedAt(cached) > DYNAMIC_MAX_AGE) {
+    await cache.delete(key);
+    cached = null;
+  }
+  const previousBody = cached ? await cached.clone().arrayBuffer() : null;
+  // Explicit refreshes (fetch with cache: 'no-cache'/'reload') wait for the network
+  const bypass = req.cache === 'no-cache' || req.cache === 'reload' || req.cache === 'no-store';
+  if (cached && !bypass) {
+    if (Date.now() - cachedAt(cached) >= REVALIDATE_MIN_INTERVAL) {
+      event.waitUntil(revalidate(req, key, previousBody).catch(() => {}));
+    }
+    return fromCache(cached);
+  }
+  try {
+    const entry = await revalidate(req, key, previousBody);
+    if (cached && entry.status >= 500) return fromCache(cached);
+    return toResponse(entry);
+  } catch (e) {
+    if (cached) return fromCache(cached);
+    throw e;
+  }
+}
+
+// Only download shell files that changed since the previous version
+async function precacheShell() {
+  const cache = await caches.open(CACHE_NAME);
+  await Promise.all(APP_SHELL.map(async (path) => {
+    const immutable = IMMUTABLE_SHELL.has(path);
+    if (immutable) {
+      const previous = await caches.match(path);
+      if (previous) return cache.put(path, previous);
+    }
+    const res = await fetch(path, { cache: immutable ? 'default' : 'no-cache' });
+    if (!res.ok) throw new Error(`Precache failed: ${path} ${res.status}`);
+    await cache.put(path, res);
+  }));
+}
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(precacheShell());
 });
 
 self.addEventListener('activate', (event) => {
   event.waitUntil(
-    caches.keys().then((keys) => Promise.all(keys.filter(k => k !== CACHE_NAME).map(k => caches.delete(k))))
+    caches.keys().then((keys) => Promise.all(
+      keys.filter(k => k !== CACHE_NAME && k !== DYNAMIC_CACHE).map(k => caches.delete(k))
+    ))
   );
 });
 
@@ -101,22 +276,10 @@ self.addEventListener('fetch', (event) => {
     );
     return;
   }
-  // Runtime cache for GET /api/get_referrals (network-first)
+  // Runtime cache for GET /api/get_referrals (stale-while-revalidate)
   const url = new URL(req.url);
   if (req.method === 'GET' && url.pathname === '/api/get_referrals') {
-    event.respondWith((async () => {
-      try {
-        const res = await fetch(req);
-        const clone = res.clone();
-        const cache = await caches.open('dynamic');
-        cache.put(req, clone);
-        return res;
-      } catch (_) {
-        const cached = await caches.match(req);
-        if (cached) return cached;
-        throw _;
-      }
-    })());
+    event.respondWith(staleWhileRevalidate(event));
     return;
   }
   // Default: network, fallback to cache
@@ -0,0 +1,396 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import unquote
+
+# Runs against the in-process fake Sheets server (bench/fake_sheets.py); no credentials needed.
+#   python test_resilience.py
+from bench.fake_sheets import FakeSheetsServer
+from bench import load_test
+
+SCRATCH = tempfile.mkdtemp(prefix='test-resilience-')
+
+fake = FakeSheetsServer().start()
+load_test.configure_env(fake.host)
+os.environ['SHEETS_JOURNAL_PATH'] = os.path.join(SCRATCH, 'journal.jsonl')
+os.environ['SHEETS_SNAPSHOT_DIR'] = SCRATCH
+os.environ['SHEETS_SNAPSHOT_PERSIST'] = '0'
+
+from api import journal, sheets, snapshots
+from api.auth import create_session
+from api.get_referrals import handler as get_handler
+
+SHEET_ID = load_test.SHEET_ID
+COOKIE = {'Cookie': 'session=' + create_session({'u': 'test'})}
+
+
+def reset(rows=30):
+    """Fresh sheet, breaker, snapshots and journal for each check."""
+    fake.rate_429 = 0.0
+    fake.latency = 0.0
+    fake.seed_referrals(SHEET_ID, rows, seed=7)
+    sheets.breaker = sheets.CircuitBreaker(failure_rate=0.5, min_calls=2, window=30.0, open_seconds=60.0)
+    with sheets._snapshots_lock:
+        sheets._snapshots.clear()
+        sheets._live_keys.clear()
+    snapshots._last.clear()
+    for name in os.listdir(SCRATCH):
+        if name.startswith('referral-snapshot-'):
+            os.remove(os.path.join(SCRATCH, name))
+    for path in (journal.journal_path(), journal.dead_letter_path()):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_single_flight_collapses_concurrent_calls():
+    print("=== Testing SingleFlight ===")
+    flight = sheets.SingleFlight(max_waiters=64, timeout=5.0)
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return ['rows']
+
+    results = []
+
+    def worker():
+        results.append(flight.do('key', slow))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    threads[0].start()
+    started.wait()
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1, calls
+    assert sum(1 for _, shared in results if shared) == 7, results
+    assert all(result == ['rows'] for result, _ in results)
+    print("OK: 8 concurrent calls, 1 execution, 7 shared")
+
+
+def test_breaker_opens_and_serves_stale_snapshot():
+    print("\n=== Testing circuit breaker -> stale read ===")
+    reset()
+    res = get_handler(load_test.BenchRequest('GET', headers=COOKIE))
+    assert res['statusCode'] == 200 and 'X-Data-Stale' not in res['headers'], res['headers']
+    fresh_count = json.loads(res['body'])['count']
+    # Clients prune their search index by the departments a response is complete for
+    assert json.loads(res['body'])['departments'] == []
+    body = json.loads(get_handler(load_test.BenchRequest('GET', args={'department': 'Cardiology'}, headers=COOKIE))['body'])
+    assert body['filtered'] and body['departments'] == ['Cardiology'], body['departments']
+
+    fake.rate_429 = 1.0  # every Sheets call is throttled
+    for _ in range(3):
+        res = get_handler(load_test.BenchRequest('GET', headers=COOKIE))
+        assert res['statusCode'] == 200, res
+    assert sheets.breaker.state == 'open', sheets.breaker.stats()
+    body = json.loads(res['body'])
+    assert res['headers']['X-Data-Stale'] == '1' and body['stale'] is True
+    assert body['count'] == fresh_count
+
+    # Open breaker: no Sheets calls at all
+    fake.reset_counters()
+    get_handler(load_test.BenchRequest('GET', headers=COOKIE))
+    assert not fake.snapshot(), fake.snapshot()
+
+    # No snapshot for this process -> 503 with Retry-After
+    with sheets._snapshots_lock:
+        sheets._snapshots.clear()
+    res = get_handler(load_test.BenchRequest('GET', headers=COOKIE))
+    assert res['statusCode'] == 503 and 'Retry-After' in res['headers'], res
+    print("OK: breaker opened, stale snapshot served, 503 without snapshot")
+
+
+def test_journal_replays_in_order():
+    print("\n=== Testing journal replay order ===")
+    reset()
+    sheets.breaker._open(sheets.breaker._clock())
+    first = sheets.write('update', '', row_number=5, values=['Dr One', 't1', 'first'])
+    second = sheets.write('update', '', row_number=5, values=['Dr Two', 't2', 'second'])
+    appended = sheets.write('append', '', row=['2025-10-01 09:00:00', 'Journal', 'ICU', '1', 'Dr', 'Emergency',
+                                               'Cardiology', 'Low', 'queued', '', '', ''])
+    assert first['queued'] and second['queued'] and appended['queued']
+    assert journal.pending() == 3
+
+    sheets.breaker = sheets.CircuitBreaker()
+    before = len(fake.rows(SHEET_ID))
+    result = sheets.write('update', '', row_number=6, values=['Dr Three', 't3', 'live'])
+    assert result == {'queued': False}, result
+    rows = fake.rows(SHEET_ID)
+    assert journal.pending() == 0
+    assert rows[4][9:12] == ['Dr Two', 't2', 'second'], rows[4]  # later update wins
+    assert rows[5][9:12] == ['Dr Three', 't3', 'live'], rows[5]
+    # Parsed like update_cell, so Time Seen lands as a date
+    assert fake.value_input_options['values.update'] == 'USER_ENTERED', fake.value_input_options
+    assert len(rows) == before + 1 and rows[-1][1] == 'Journal'
+    print("OK: 3 journaled writes replayed in order before the new write")
+
+
+def test_poison_entry_is_dead_lettered():
+    print("\n=== Testing poison journal entry ===")
+    reset()
+    journal.record('update', shard='', row_number='abc', values=['x', 'y', 'z'])
+    for _ in range(3):
+        assert sheets.write('update', '', row_number=3, values=['Dr', 't', 'n']) == {'queued': False}
+    assert journal.pending() == 0
+    assert journal.dead_letters() == 1
+    with open(journal.dead_letter_path(), encoding='utf-8') as f:
+        dead = json.loads(f.readline())
+    assert dead['row_number'] == 'abc' and dead['error']
+    print("OK: bad entry moved aside, later writes applied")
+
+
+def test_warm_start_reports_snapshot_age():
+    print("\n=== Testing warm-start snapshot age ===")
+    reset()
+    records = sheets.open_shard('').get_all_records()
+    assert snapshots.save(sheets._shard_key(''), records, time.time() - 60)
+    res = get_handler(load_test.BenchRequest('GET', headers=COOKIE))
+    body = json.loads(res['body'])
+    assert res['headers']['X-Data-Source'] == 'snapshot', res['headers']
+    assert 60 <= body['snapshot_age'] < 120 and 'stale' not in body, body.get('snapshot_age')
+    print("OK: a disk snapshot is served with its age in the body")
+
+
+def test_shard_routing():
+    print("\n=== Testing sharded reads and writes ===")
+    from api.submit_referral import handler as submit_handler
+    from api.update_referral import handler as update_handler
+    reset(rows=10)
+    fake.seed_referrals(SHEET_ID, 4, sheet='Cardiology', seed=3, departments=['Cardiology'])
+    os.environ['SHEET_SHARDS'] = json.dumps({'Cardiology': 'Cardiology'})
+    try:
+        # Unfiltered: both worksheets, fanned out and merged, rows tagged by shard
+        body = json.loads(get_handler(load_test.BenchRequest('GET', headers=COOKIE))['body'])
+        shards = [(r['_shard'], r['_row_number']) for r in body['referrals']]
+        assert body['count'] == 14 and len(set(shards)) == 14
+        assert {shard for shard, _ in shards} == {'', 'Cardiology'}
+        assert sorted(row for shard, row in shards if shard == 'Cardiology') == [2, 3, 4, 5]
+
+        # A filtered read only touches the department's worksheet
+        body = json.loads(get_handler(load_test.BenchRequest('GET', args={'department': 'Cardiology'},
+                                                             headers=COOKIE))['body'])
+        assert {r['_shard'] for r in body['referrals']} == {'Cardiology'} and body['count'] == 4
+
+        # New referrals land in the worksheet of their Department To
+        payload = {'patient_surname': 'Sharded', 'ward': 'ICU', 'bed_number': '9', 'referring_clinician': 'Dr',
+                   'dept_from': 'Emergency', 'dept_to': 'Cardiology', 'urgency_level': 'High',
+                   'referral_notes': 'chest pain'}
+        res = submit_handler(load_test.BenchRequest('POST', body=json.dumps(payload), headers=COOKIE))
+        assert res['statusCode'] == 200 and json.loads(res['body'])['shard'] == 'Cardiology', res
+        assert fake.rows(SHEET_ID, 'Cardiology')[-1][1] == 'Sharded'
+        assert 'Sharded' not in [row[1] for row in fake.rows(SHEET_ID)]
+
+        # Updates address (shard, row); the same row number elsewhere is untouched
+        update = {'shard': 'Cardiology', 'row_number': 3, 'clinician_seen': 'Dr Heart', 'clinician_notes': 'ok'}
+        res = update_handler(load_test.BenchRequest('POST', body=json.dumps(update), headers=COOKIE))
+        assert res['statusCode'] == 200, res
+        assert fake.rows(SHEET_ID, 'Cardiology')[2][9] == 'Dr Heart'
+        assert fake.rows(SHEET_ID)[2][9] != 'Dr Heart'
+
+        res = update_handler(load_test.BenchRequest('POST', body=json.dumps({**update, 'shard': 'Nowhere'}),
+                                                    headers=COOKIE))
+        assert res['statusCode'] == 400 and 'Unknown shard' in res['body'], res
+    finally:
+        os.environ.pop('SHEET_SHARDS')
+    print("OK: fan-out merge tags shards, writes routed by department and (shard, row), unknown shard 400")
+
+
+def test_request_ids_prevent_duplicate_writes():
+    print("\n=== Testing idempotent writes ===")
+    from api.submit_referral import handler as submit_handler
+    reset()
+    before = len(fake.rows(SHEET_ID))
+
+    def submit(**extra):
+        payload = {'patient_surname': 'Idem', 'ward': 'ICU', 'bed_number': '4', 'referring_clinician': 'Dr',
+                   'dept_from': 'Emergency', 'dept_to': 'Cardiology', 'urgency_level': 'Low',
+                   'referral_notes': 'n', **extra}
+        res = submit_handler(load_test.BenchRequest('POST', body=json.dumps(payload), headers=COOKIE))
+        return res['statusCode'], json.loads(res['body'])
+
+    # Resends while Sheets is down keep one journal entry
+    sheets.breaker._open(sheets.breaker._clock())
+    assert submit(request_id='req-00000001')[0] == 202
+    assert submit(request_id='req-00000001', retry=True)[0] == 202
+    assert journal.pending() == 1
+
+    # The append landed although its call timed out: replay does not add it again
+    fake.values_append(SHEET_ID, 'Sheet1', [['2025-10-01 09:00:00', 'Idem'] + [''] * 10 + ['req-00000001']])
+    sheets.breaker = sheets.CircuitBreaker()
+    res = get_handler(load_test.BenchRequest('GET', headers=COOKIE))  # a live read replays the journal
+    assert res['statusCode'] == 200 and journal.pending() == 0
+    assert len(fake.rows(SHEET_ID)) == before + 1
+
+    # A resend of a write that already reached the sheet is confirmed, not appended
+    status, body = submit(request_id='req-00000002')
+    assert status == 200 and not body['queued']
+    status, body = submit(request_id='req-00000002', retry=True)
+    assert status == 200 and not body['queued']
+    rows = fake.rows(SHEET_ID)
+    assert len(rows) == before + 2 and rows[-1][12] == 'req-00000002', rows[-1]
+
+    assert submit(request_id='bad id!')[0] == 400
+    print("OK: one journal entry per request id, no duplicate appends on replay or resend")
+
+
+def test_corrupt_and_truncated_snapshots_are_ignored():
+    print("\n=== Testing snapshot checksum ===")
+    key = ('test', 'snapshot')
+    records = [{'Patient Surname': f'Row {i}', 'Bed Number': i} for i in range(200)]
+    assert snapshots.save(key, records, 1000.0)
+    loaded = snapshots.load(key)
+    assert loaded[0] == records and loaded[1] == 1000.0
+
+    path = snapshots.snapshot_path(key)
+    with open(path, 'rb') as f:
+        good = f.read()
+
+    corrupt = bytearray(good)
+    corrupt[-5] ^= 0xFF
+    with open(path, 'wb') as f:
+        f.write(corrupt)
+    assert snapshots.load(key) is None
+
+    with open(path, 'wb') as f:
+        f.write(good[:len(good) // 2])
+    assert snapshots.load(key) is None
+
+    with open(path, 'wb') as f:
+        f.write(good[:10])
+    assert snapshots.load(key) is None
+
+    # An older read never replaces a newer snapshot
+    with open(path, 'wb') as f:
+        f.write(good)
+    snapshots._last.clear()
+    assert not snapshots.save(key, records[:10], 900.0)
+    assert snapshots.load(key)[0] == records
+    print("OK: corrupt and truncated files rejected, older save ignored")
+
+
+def test_encoder_handles_big_integers():
+    print("\n=== Testing JSON encoding of long numeric cells ===")
+    from api.encoding import FragmentCache, dumps
+    record = {'Bed Number': 123456789012345678901234, 'Patient Surname': 'Big', '_shard': '', '_row_number': 2}
+    for encoder in ('auto', 'stdlib'):
+        os.environ['JSON_ENCODER'] = encoder
+        assert json.loads(dumps(record)) == record
+        assert json.loads(FragmentCache().encode_rows([record])) == [record]
+    os.environ.pop('JSON_ENCODER', None)
+
+    reset(rows=5)
+    fake.rows(SHEET_ID)  # ensure the sheet exists
+    fake.values_update(SHEET_ID, 'Sheet1!D3', [['123456789012345678901234']])
+    res = get_handler(load_test.BenchRequest('GET', headers=COOKIE))
+    assert res['statusCode'] == 200, res
+    assert 123456789012345678901234 in [r['Bed Number'] for r in json.loads(res['body'])['referrals']]
+    print("OK: values beyond 64 bits encode with either backend")
+
+
+def test_export_pages_stop_at_end_of_data():
+    print("\n=== Testing paged shard reads ===")
+    reset(rows=30)
+    fake.values_update(SHEET_ID, 'Sheet1!A10:L10', [[''] * 12])  # a cleared row mid-sheet
+    fake.reset_counters()
+    rows = list(sheets.iter_shard_rows('', page_size=7))
+    assert len(rows) == 29, len(rows)
+    assert 10 not in [n for n, _ in rows] and rows[-1][0] == 31, rows[-1]
+    assert all(record['Patient Surname'] for _, record in rows)
+    # 1 header read + 5 pages of 7 for 30 data rows, not one per page up to row_count
+    assert fake.snapshot()['values.get'] == 6, fake.snapshot()
+    print("OK: 29 records in 5 pages, blank row skipped, no reads past the data")
+
+
+def test_export_pages_and_cursor():
+    print("\n=== Testing export bodies ===")
+    from api.export import handler as export_handler
+    reset(rows=30)
+
+    def export(**query):
+        return export_handler(load_test.BenchRequest('GET', args=query, headers=COOKIE))
+
+    res = export(format='csv', department='No Such Department')
+    assert res['statusCode'] == 200 and isinstance(res['body'], str), res
+    assert res['body'].splitlines() == [','.join(fake.rows(SHEET_ID)[0] + ['_shard', '_row_number'])], res['body']
+
+    res = export(format='ndjson')
+    assert len(res['body'].splitlines()) == 30
+
+    # Pages bounded by size: every page is a whole CSV, X-Export-Next resumes until done
+    os.environ['EXPORT_MAX_BYTES'] = '2000'
+    try:
+        pages = []
+        cursor = None
+        while True:
+            res = export(format='csv', **({'cursor': unquote(cursor)} if cursor else {}))
+            assert res['statusCode'] == 200, res
+            pages.append(list(csv.reader(io.StringIO(res['body']))))
+            cursor = res['headers'].get('X-Export-Next')
+            if cursor is None:
+                break
+            assert res['headers']['X-Export-Stopped'] == 'size'
+    finally:
+        os.environ.pop('EXPORT_MAX_BYTES')
+    assert len(pages) > 1 and all(page[0] == pages[0][0] for page in pages)
+    row_numbers = [int(row[-1]) for page in pages for row in page[1:]]
+    assert row_numbers == list(range(2, 32)), row_numbers
+
+    # Past the time budget the page ends with a cursor instead of running into maxDuration
+    fake.latency = 0.3
+    os.environ['EXPORT_TIME_BUDGET'] = '2'
+    os.environ['EXPORT_PAGE_SIZE'] = '5'
+    try:
+        started = time.monotonic()
+        res = export(format='ndjson')
+        elapsed = time.monotonic() - started
+    finally:
+        os.environ.pop('EXPORT_TIME_BUDGET')
+        os.environ.pop('EXPORT_PAGE_SIZE')
+        fake.latency = 0.0
+    assert res['statusCode'] == 200 and res['headers']['X-Export-Stopped'] == 'time', res['headers']
+    assert elapsed < 2.5, elapsed
+    last = json.loads(res['body'].splitlines()[-1])
+    assert unquote(res['headers']['X-Export-Next']) == f":{last['_row_number'] + 1}"
+
+    assert export(format='csv', cursor='Nowhere:5')['statusCode'] == 400
+
+    # Cells that spreadsheet apps would run as formulas are quoted
+    fake.values_update(SHEET_ID, 'Sheet1!B2:C2', [['=HYPERLINK("http://x","y")', '@SUM(1)']])
+    row = next(csv.reader(io.StringIO(export(format='csv')['body'].splitlines()[1])))
+    assert row[1:3] == ['\'=HYPERLINK("http://x","y")', "'@SUM(1)"], row
+
+    os.environ['EXPORT_STREAMING'] = '1'
+    try:
+        body = export(format='csv')['body']
+        assert not isinstance(body, str)
+        assert len(''.join(body).splitlines()) == 31
+    finally:
+        os.environ.pop('EXPORT_STREAMING')
+    print("OK: header-only CSV when nothing matches, pages bounded by size and time resume by cursor, "
+          "formulas quoted")
+
+
+if __name__ == '__main__':
+    try:
+        test_single_flight_collapses_concurrent_calls()
+        test_breaker_opens_and_serves_stale_snapshot()
+        test_journal_replays_in_order()
+        test_poison_entry_is_dead_lettered()
+        test_warm_start_reports_snapshot_age()
+        test_shard_routing()
+        test_request_ids_prevent_duplicate_writes()
+        test_corrupt_and_truncated_snapshots_are_ignored()
+        test_encoder_handles_big_integers()
+        test_export_pages_stop_at_end_of_data()
+        test_export_pages_and_cursor()
+    finally:
+        fake.stop()